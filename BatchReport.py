@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import argparse
+import matplotlib
+# No windows: every chart is drawn straight to a file, in this process and in the workers
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import details
+import GraphingScript
+from DatasetCache import load_day
+
+# Renders the GraphingScript analyses for many days without the input() menu, e.g.
+#   python BatchReport.py 2024-04-16 2024-04-17
+#   python BatchReport.py --from 2024-04-01 --to 2024-04-30 --workers 4
+# Each day is one task in a process pool, so its cached day and rollups are loaded once and
+# shared by all of its charts. Output goes to <output>/<day>/<n>_<chart>.<format>.
+
+CHARTS = {
+    "1_DataAveraged": GraphingScript.DataAveraged,
+    "2_PowerVsAngle": GraphingScript.PowerVsAngle,
+    "3_PowVsCloud": GraphingScript.PowVsCloud,
+    "4_MinutePowVsCloud": GraphingScript.MinutePowVsCloud,
+    "5_FifteenMinutePowVsCloud": GraphingScript.FifteenMinutePowVsCloud,
+    "6_FifteenMinutePowVsSunElevationAngle": GraphingScript.FifteenMinutePowVsSunElevationAngle,
+    "7_TotalPower": GraphingScript.TotalPower,
+}
+
+def day_filename(directory, day):
+    # Prefer the exported workbook, fall back to the CSV of a day the logger has not exported yet
+    for extension in ("xlsx", "csv"):
+        filename = f"{day}_data.{extension}"
+        if os.path.isfile(os.path.join(directory, filename)):
+            return filename
+    return None
+
+def expand_days(days, start=None, end=None):
+    # Dates or day file names, plus every day from start to end inclusive
+    expanded = [os.path.basename(day)[:10] for day in days]
+    if start is not None or end is not None:
+        expanded += [f"{day:%Y-%m-%d}" for day in pd.date_range(start or end, end or start, freq="D")]
+    return list(dict.fromkeys(expanded))
+
+def render_day(directory, filename, output, charts=None, image_format="png", max_points=GraphingScript.max_points_default):
+    charts = list(CHARTS) if charts is None else charts
+    day_output = os.path.join(output, filename[:10])
+    os.makedirs(day_output, exist_ok=True)
+    written = []
+    failed = {}
+    try:
+        load_day(directory, filename)
+    except Exception as e:
+        # An unreadable or corrupt day file only costs that day, the batch carries on
+        failed["load"] = f"{type(e).__name__}: {e}"
+        return filename[:10], written, failed
+    for name in charts:
+        extension = "txt" if name == "7_TotalPower" else image_format
+        path = os.path.join(day_output, f"{name}.{extension}")
+        try:
+            CHARTS[name](directory, filename, save_path=path, max_points=max_points)
+            written.append(path)
+        except (KeyError, ValueError, TypeError) as e:
+            # e.g. a day logged before a column existed, the other charts still get drawn
+            plt.close('all')
+            failed[name] = f"{type(e).__name__}: {e}"
+    return filename[:10], written, failed
+
+def render_all(directory, days, output, charts=None, workers=None, image_format="png", max_points=GraphingScript.max_points_default):
+    results = {}
+    missing = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for day in days:
+            filename = day_filename(directory, day)
+            if filename is None:
+                missing.append(day)
+                continue
+            futures[executor.submit(render_day, directory, filename, output, charts, image_format, max_points)] = filename[:10]
+        for future in as_completed(futures):
+            try:
+                day, written, failed = future.result()
+            except Exception as e:
+                # e.g. the worker process died, report the day and wait for the rest
+                day, written, failed = futures[future], [], {"worker": f"{type(e).__name__}: {e}"}
+            results[day] = (written, failed)
+            print(f"{day}: {len(written)} charts" + (f", failed {failed}" if failed else ""))
+    for day in missing:
+        print(f"{day}: no data file in {directory}")
+    return results, missing
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the GraphingScript charts for many days to files")
+    parser.add_argument("days", nargs="*", help="days as YYYY-MM-DD or day file names")
+    parser.add_argument("--from", dest="start", help="first day of a range")
+    parser.add_argument("--to", dest="end", help="last day of a range")
+    parser.add_argument("--directory", default=details.BASE_PATH, help="where the day files are")
+    parser.add_argument("--output", help="defaults to a reports folder in the directory")
+    parser.add_argument("--charts", nargs="+", choices=list(CHARTS), help="defaults to all seven")
+    parser.add_argument("--workers", type=int, help="defaults to one per CPU")
+    parser.add_argument("--format", default="png", help="any format matplotlib can save, e.g. png, svg, pdf")
+    parser.add_argument("--max-points", type=int, default=GraphingScript.max_points_default, help="raw series are thinned to this many points, 0 for all")
+    args = parser.parse_args()
+
+    days = expand_days(args.days, args.start, args.end)
+    if not days:
+        parser.print_usage()
+        sys.exit(1)
+    output = args.output or os.path.join(args.directory, "reports")
+    started = time.perf_counter()
+    results, missing = render_all(args.directory, days, output, args.charts, args.workers, args.format, args.max_points or None)
+    rendered = sum(1 for written, failed in results.values() if written)
+    print(f"Rendered {rendered} of {len(results)} days to {output} in {time.perf_counter() - started:.1f}s")
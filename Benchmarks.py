@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import matplotlib
+# Charts are rendered to files, so the chart cases time the drawing as well as the data
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import DatasetCache
+from GraphingScript import DataAveraged
+from DataLogSink import LogSink
+from Esp32Emulator import format_record
+from LoggingPipeline import RECORD_COLUMNS, WEATHER_COLUMNS, parse_record, build_row
+from TelemetryFrame import encode_frames, decode_frames, frames_to_records
+
+# Timings for the logging and analysis hot paths on synthetic days, each written as one JSON
+# line so runs on different commits can be compared, e.g.
+#   python Benchmarks.py --rows 10000 100000 --output benchmarks.jsonl
+# Every case is timed on its own and then run again under tracemalloc for the peak memory,
+# so the tracing overhead does not end up in the timings.
+
+EXCEL_MAX_ROWS = 1048575
+
+def synthetic_day(rows, day="2024-04-16", seed=0):
+    # Rows shaped like build_row output, spread over the day with second resolution like the board's clock
+    rng = np.random.default_rng(seed)
+    offsets = np.linspace(0, 86399, rows).astype(np.int64)
+    received = pd.Timestamp(day) + pd.to_timedelta(offsets, unit="s")
+    sun = np.clip(np.sin((offsets / 86400 - 0.25) * 2 * np.pi), 0, None)
+    df = pd.DataFrame({"Time Recieved": received, "Time Logged": received.strftime("%H:%M:%S"),
+                       "Just Calculated": (offsets % 300 == 0).astype(np.int64)})
+    for column in RECORD_COLUMNS[2:]:
+        df[column] = np.round(rng.random(rows) * sun * 2, 5)
+    df["Temperature"] = 283.15
+    df["Weather"] = "Clouds"
+    df["Description"] = "broken clouds"
+    df["Cloud Coverage"] = rng.integers(0, 101, rows)
+    df["Pressure"] = 1013
+    df["Humidity"] = 80
+    df["Weather Age(s)"] = 30.0
+    return df
+
+def synthetic_rows(df):
+    # One row dict at a time like the pipeline hands them to the sink, so a big day is never
+    # held as a list of dicts
+    columns = list(df.columns)
+    for values in df.itertuples(index=False, name=None):
+        yield dict(zip(columns, values))
+
+def synthetic_lines(df):
+    fields = df[RECORD_COLUMNS[2:]].to_numpy()
+    return [format_record(timeLogged, calc, values) for timeLogged, calc, values in zip(df["Time Logged"], df["Just Calculated"], fields)]
+
+def synthetic_frames(df):
+    seconds = (df["Time Recieved"] - df["Time Recieved"].dt.normalize()).dt.total_seconds().to_numpy(dtype=np.int64)
+    return encode_frames(np.arange(len(df)), df["Just Calculated"].to_numpy(), seconds, df[RECORD_COLUMNS[2:]].to_numpy())
+
+def write_day(df, directory):
+    # GraphingScript reads workbooks, which stop at Excel's row limit, so bigger days are CSV
+    extension = "xlsx" if len(df) <= EXCEL_MAX_ROWS else "csv"
+    path = os.path.join(directory, f"{df['Time Recieved'].iloc[0]:%Y-%m-%d}_data.{extension}")
+    if extension == "xlsx":
+        df.to_excel(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+def check_and_update_excel(data, file_name):
+    # The per-row path the loggers used before LogSink: read the whole day, add a row, write it back
+    if os.path.isfile(file_name):
+        existing_data = pd.read_excel(file_name)
+        data = pd.DataFrame.from_dict({key: [value] for key, value in data.items()})
+        updated_data = pd.concat([existing_data, data], ignore_index=True)
+    else:
+        updated_data = pd.DataFrame.from_dict({key: [value] for key, value in data.items()})
+    updated_data.to_excel(file_name, index=False)
+
+def legacy_chart(filepath, save_path):
+    # What GraphingScript's DataAveraged did before the dataset cache, rollups and LTTB: parse
+    # the workbook, group every resolution from the raw rows and plot all of them
+    df = pd.read_excel(filepath) if filepath.endswith(".xlsx") else pd.read_csv(filepath)
+    df["Timestamp"] = pd.to_datetime(df["Time Logged"], format="%H:%M:%S")
+    plt.plot(df["Timestamp"], df["SPA Panel Power(W)"], label="Raw Data")
+    for freq in ("min", "15min", "30min", "h"):
+        averaged = df.groupby(df["Timestamp"].dt.round(freq))["SPA Panel Power(W)"].mean()
+        plt.plot(averaged.index, averaged.values, label=freq)
+    plt.xlabel("Time")
+    plt.ylabel("SPA Panel Power(W)")
+    plt.title("SPA Panel Power vs Time")
+    plt.legend()
+    plt.grid(True)
+    plt.xticks(rotation=45)
+    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+    plt.savefig(save_path, dpi=100, bbox_inches="tight")
+    plt.close("all")
+
+def ingest_legacy(ctx):
+    file_name = os.path.join(ctx["tmp"], "legacy.xlsx")
+    for row in ctx["legacy_rows"]:
+        check_and_update_excel(row, file_name)
+    os.remove(file_name)
+    return len(ctx["legacy_rows"])
+
+def ingest_logsink(ctx):
+    directory = tempfile.mkdtemp(dir=ctx["tmp"])
+    sink = LogSink(base_path=directory, export_excel=False)
+    for row in synthetic_rows(ctx["day"]):
+        sink.append(row)
+    sink.close()
+    return ctx["size"]
+
+def parse_text(ctx):
+    for line in ctx["lines"]:
+        parse_record(line)
+    return len(ctx["lines"])
+
+def parse_binary(ctx):
+    frames, _, _ = decode_frames(ctx["frames"])
+    return len(frames)
+
+def parse_binary_records(ctx):
+    frames, _, _ = decode_frames(ctx["frames"])
+    return len(frames_to_records(frames))
+
+def chart_legacy(ctx):
+    legacy_chart(ctx["day_file"], ctx["chart_file"])
+    return ctx["size"]
+
+def chart_cold(ctx):
+    # First chart of a day: parse, roll up, write both caches and render DataAveraged
+    directory, filename = os.path.split(ctx["day_file"])
+    for path in os.listdir(os.path.join(directory, ".cache")) if os.path.isdir(os.path.join(directory, ".cache")) else []:
+        os.remove(os.path.join(directory, ".cache", path))
+    DatasetCache.loaded_days.clear()
+    DataAveraged(directory, filename, save_path=ctx["chart_file"])
+    return ctx["size"]
+
+def chart_warm(ctx):
+    # A later chart in a new session: the day and its rollups come back from the cache files
+    directory, filename = os.path.split(ctx["day_file"])
+    DatasetCache.loaded_days.clear()
+    DataAveraged(directory, filename, save_path=ctx["chart_file"])
+    return ctx["size"]
+
+BENCHMARKS = {
+    "ingest_legacy": ingest_legacy,
+    "ingest_logsink": ingest_logsink,
+    "parse_text": parse_text,
+    "parse_binary": parse_binary,
+    "parse_binary_records": parse_binary_records,
+    "chart_legacy": chart_legacy,
+    "chart_cold": chart_cold,
+    "chart_warm": chart_warm,
+}
+
+def prepare(size, tmp, names, legacy_rows):
+    df = synthetic_day(size)
+    ctx = {"size": size, "tmp": tmp}
+    if {"ingest_legacy", "ingest_logsink"} & set(names):
+        weather = tuple(df[WEATHER_COLUMNS].iloc[0])
+        records = [parse_record(line) for line in synthetic_lines(df.iloc[:max(legacy_rows, 1)])]
+        ctx["legacy_rows"] = [build_row(record, str(datetime.now()), weather) for record in records[:legacy_rows]]
+        ctx["day"] = df
+    if "parse_text" in names:
+        ctx["lines"] = synthetic_lines(df)
+    if {"parse_binary", "parse_binary_records"} & set(names):
+        ctx["frames"] = bytearray(synthetic_frames(df))
+    if {"chart_legacy", "chart_cold", "chart_warm"} & set(names):
+        ctx["day_file"] = write_day(df, tmp)
+        ctx["chart_file"] = os.path.join(tmp, "chart.png")
+        # The warm case needs the cache files in place
+        chart_cold(ctx)
+    return ctx
+
+def run_case(name, ctx, memory=True):
+    # The code under test prints progress, which would end up between the JSON lines
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        count = BENCHMARKS[name](ctx)
+        seconds = time.perf_counter() - started
+    result = {"benchmark": name, "rows": count, "seconds": round(seconds, 6),
+              "rows/s": round(count / seconds, 1) if seconds > 0 else None,
+              "us/row": round(seconds / count * 1e6, 3) if count else None}
+    if memory:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            tracemalloc.start()
+            BENCHMARKS[name](ctx)
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            tracemalloc.stop()
+    return result
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"time": datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "machine": platform.machine(), "cache": DatasetCache.CACHE_EXTENSION}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the logging and analysis hot paths")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="synthetic day sizes")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--legacy-rows", type=int, default=200, help="rows for ingest_legacy, which is quadratic")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="append JSON lines to this file as well as printing them")
+    args = parser.parse_args(argv)
+
+    env = environment()
+    output = open(args.output, "a") if args.output else None
+    try:
+        for size in args.rows:
+            with tempfile.TemporaryDirectory() as tmp:
+                ctx = prepare(size, tmp, args.only, args.legacy_rows)
+                for name in args.only:
+                    line = json.dumps({**env, "size": size, **run_case(name, ctx, not args.no_memory)})
+                    print(line)
+                    if output is not None:
+                        output.write(line + "\n")
+                        output.flush()
+    finally:
+        if output is not None:
+            output.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
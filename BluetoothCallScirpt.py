@@ -1,14 +1,37 @@
-import subprocess
-import time
+import BluetoothDataLogging
+import LoggerMetrics
+from DataLogSink import LogSink
+from LoggingPipeline import LoggingPipeline
+from LoggerSupervisor import Supervisor
+from LoggerMetrics import start_exporters, stop_exporters
+from LiveBuffer import start_live_server
+
+# Runs the Bluetooth logger in this interpreter instead of respawning it as a new process.
+# If the serial port or the log file fails only that part is reopened.
 
 def call_python_script():
+    supervisor = Supervisor()
+    source = supervisor.source("serial source", BluetoothDataLogging.open_serial_source)
+    sink = supervisor.sink("log sink", LogSink)
+    weather_provider = BluetoothDataLogging.weather_provider
+    energy = BluetoothDataLogging.energy
+    live_buffer = BluetoothDataLogging.live_buffer
+    validator = BluetoothDataLogging.validator
+    weather_provider.start()
+    LoggerMetrics.metrics.attach("supervisor", supervisor.stats)
+    exporters = start_exporters()
+    live_server = start_live_server(live_buffer)
     try:
-        while True:
-            subprocess.run(["python", r" "]) # Put the file path to BluetoothDataLogging.py
-    except Exception as e:
-        print(f"Error occurred: {e}")
-        print("Restarting the script...")
-        time.sleep(1)
-        call_python_script()
+        supervisor.run(lambda: LoggingPipeline(source, sink, weather_provider, energy=energy, live=live_buffer, validator=validator))
+    except KeyboardInterrupt:
+        print("\nCommunication and logging terminated.")
+    finally:
+        weather_provider.stop()
+        sink.close()
+        energy.close()
+        stop_exporters(exporters)
+        if live_server is not None:
+            live_server.stop()
+        print(supervisor.stats())
 
-call_python_script()
\ No newline at end of file
+call_python_script()
@@ -64,6 +64,11 @@
 #define clientLedPin 4
 #define SCREEN_WIDTH 128 // OLED display width, in pixels
 #define SCREEN_HEIGHT 64 // OLED display height, in pixels
+#define USE_SPA_EPHEMERIS 0 // 1 looks the sun position up in spa_ephemeris.h (python SolarEphemeris.py <year>) instead of running spa_calculate
+
+#if USE_SPA_EPHEMERIS
+#include "spa_ephemeris.h"
+#endif
 
 Adafruit_SSD1306 display(SCREEN_WIDTH, SCREEN_HEIGHT, &Wire, -1);
 
@@ -93,6 +98,10 @@ float servoZenith = 0;
 float servoAzimuth = 0;
 float bestRotateAngle = 0;
 float bestTiltAngle = 0;
+String syncDateStamp = "";
+unsigned long syncSecondsOfDay = 0;
+unsigned long syncMillis = 0;
+bool timeSynced = false;
 
 // Function definitions
 void lcdStartup();
@@ -102,6 +111,7 @@ String readCompleteMessage();
 unsigned long getTimeInSeconds(String timeStamp);
 void servoSetup();
 void solarPositionAlgorithmUpdate(spa_data *spa,String dateStamp,String timeStamp);
+bool ephemerisUpdate(spa_data *spa,String dateStamp,String timeStamp);
 void servoMove(spa_data spa,float &servoZenith,float &servoAzimuth);
 void readPanelAndCalculatePower(float &resistorMilliVolts,int panelPin,float &circuitCurrent,float &measureResistor,float &fixedResistor,float &circuitTotalVoltage,float &panelPower);
 void trackingCall(float servoZenith,float servoAzimuth,float &bestRotateAngle,float &bestTiltAngle,float &resistorMilliVoltsTrackingPanel,int panelPin,float &circuitCurrentTrackingPanel,float &measureResistorTrackingPanel,float &fixedResistorTrackingPanel,float &circuitTotalVoltageTrackingPanel,float &trackingPanelPower);
@@ -146,8 +156,17 @@ void loop()
   unsigned long timeInSeconds = getTimeInSeconds(timeStamp);
   if((timeInSeconds - lastCallTime) >= 300)
   {
+#if USE_SPA_EPHEMERIS
+    // The header only covers EPHEMERIS_YEAR, in any other year the SPA is run as usual
+    if(!ephemerisUpdate(&spa,dateStamp,timeStamp))
+    {
+      solarPositionAlgorithmUpdate(&spa,dateStamp,timeStamp);
+      result = spa_calculate(&spa);
+    }
+#else
     solarPositionAlgorithmUpdate(&spa,dateStamp,timeStamp);
     result = spa_calculate(&spa);
+#endif
     servoMove(spa,servoZenith,servoAzimuth);
     trackingCall(servoZenith,servoAzimuth,bestRotateAngle,bestTiltAngle,resistorMilliVoltsTrackingPanel,3,circuitCurrentTrackingPanel,circuitTotalVoltageTrackingPanel,trackingPanelPower);
     lastCallTime = timeInSeconds;
@@ -193,34 +212,49 @@ void bluetoothSetup()
 
 void getTime(String &dateStamp, String &timeStamp)
 {
-  String formattedDate = readCompleteMessage();
-  int splitT = formattedDate.indexOf(" ");
-  dateStamp = formattedDate.substring(0, splitT);
-  timeStamp = formattedDate.substring(splitT+1, formattedDate.length());
+  // The logger sends the time at start up and then on its own schedule, in between the
+  // time is carried forward with millis() so a sample never waits on the host
+  while(!timeSynced || SerialBT.available())
+  {
+    String formattedDate = readCompleteMessage();
+    int splitT = formattedDate.indexOf(" ");
+    if(splitT > 0)
+    {
+      syncDateStamp = formattedDate.substring(0, splitT);
+      syncSecondsOfDay = getTimeInSeconds(formattedDate.substring(splitT+1, formattedDate.length()));
+      syncMillis = millis();
+      timeSynced = true;
+    }
+  }
+  unsigned long secondsOfDay = (syncSecondsOfDay + (millis() - syncMillis)/1000) % 86400;
+  char formattedTime[9];
+  sprintf(formattedTime, "%02lu:%02lu:%02lu", secondsOfDay/3600, (secondsOfDay/60)%60, secondsOfDay%60);
+  dateStamp = syncDateStamp;
+  timeStamp = String(formattedTime);
 }
 
 String readCompleteMessage()
 {
   String receivedTextBT = "";
-  while (!SerialBT.available()) {
-    delay(20);
-  }
-  while (SerialBT.available()) {
+  while(true)
+  {
+    while(!SerialBT.available())
+    {
+      delay(1);
+    }
     char receivedCharBT = SerialBT.read();
-    if (receivedCharBT == '\n' || receivedCharBT == '\r')
+    if(receivedCharBT == '\n' || receivedCharBT == '\r')
     {
-      String completeMessage = receivedTextBT;
-      receivedTextBT = "";
-      return completeMessage;
-    } 
-    else 
+      if(receivedTextBT.length() > 0)
+      {
+        return receivedTextBT;
+      }
+    }
+    else
     {
-      // Add the received character to the current message string.
       receivedTextBT += receivedCharBT;
     }
-    delay(20);
   }
-  return "";  // Return an empty string if no complete message is received.
 }
 
 unsigned long getTimeInSeconds(String timeStamp)
@@ -270,6 +304,26 @@ void solarPositionAlgorithmUpdate(spa_data *spa,String dateStamp,String timeStam
   spa->function      = SPA_ALL;
 }
 
+#if USE_SPA_EPHEMERIS
+bool ephemerisUpdate(spa_data *spa,String dateStamp,String timeStamp)
+{
+  // A header generated for another year (or a clock that has not been set yet) would give
+  // positions for the wrong day, so only look up dates in EPHEMERIS_YEAR
+  int year = dateStamp.substring(0,4).toInt();
+  if(year != EPHEMERIS_YEAR)
+  {
+    return false;
+  }
+  int dayOfYear = ephemerisDayOfYear(year,dateStamp.substring(5,7).toInt(),dateStamp.substring(8,10).toInt());
+  float zenith = 0;
+  float azimuth = 0;
+  ephemerisLookup(dayOfYear,getTimeInSeconds(timeStamp),&zenith,&azimuth);
+  spa->zenith = zenith;
+  spa->azimuth = azimuth;
+  return true;
+}
+#endif
+
 void servoMove(spa_data spa,float &servoZenith,float &servoAzimuth)
 {
   float zenith = spa.zenith;
@@ -375,17 +429,7 @@ void lcdDisplayPower(float trackingPanelPower,float referencePanelPower,float sp
 void sendDataBT(String formatedData)
 {
   digitalWrite(clientLedPin, HIGH);
-  while (!SerialBT.available()) {
-    delay(20);
-  }
-  if(SerialBT.available())
-  {
-    for(int i = 0; i < formatedData.length();i++) 
-    {
-      char sendCharBT = formatedData[i];
-      SerialBT.write(sendCharBT);
-      delay(20);
-    }
-  }
+  // One newline terminated record per sample, the logger frames on the newline
+  SerialBT.println(formatedData);
   digitalWrite(clientLedPin, LOW);
 }
\ No newline at end of file
@@ -0,0 +1,201 @@
+import os
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
+import details
+from DatasetCache import load_day, load_rejected, cache_key
+from EnergyAccounting import sample_times
+
+# Every logged day in one place, for questions that span months or years. Each day file is
+# ingested once into its own Parquet partition (<archive>/year=YYYY/month=MM/YYYY-MM-DD.parquet)
+# written in row groups of ARCHIVE_BATCH_ROWS, and index.csv keeps one small line per
+# partition: rows, first/last time, cloud coverage range and weather types. Queries pick the
+# partitions from the index and then stream them a row group at a time, so an aggregation
+# over the whole archive only ever holds one batch in memory. Days come in through
+# DatasetCache, so rows that fail the DataValidation checks never reach the archive.
+
+INDEX_COLUMNS = ["Day", "Path", "Source", "Source Key", "Rows", "First", "Last",
+                 "Cloud Min", "Cloud Max", "Cloud Mean", "Weather", "Quarantined"]
+
+def archive_path(archive=None):
+    return os.path.join(details.BASE_PATH, details.ARCHIVE_DIRECTORY) if archive is None else archive
+
+def partition_path(day, archive=None):
+    return os.path.join(archive_path(archive), f"year={day[:4]}", f"month={day[5:7]}", f"{day}.parquet")
+
+def index_path(archive=None):
+    return os.path.join(archive_path(archive), "index.csv")
+
+def read_index(archive=None):
+    path = index_path(archive)
+    if not os.path.isfile(path):
+        return pd.DataFrame(columns=INDEX_COLUMNS)
+    index = pd.read_csv(path, parse_dates=["First", "Last"], keep_default_na=False, na_values=[""])
+    index["Weather"] = index["Weather"].fillna("")
+    return index
+
+def write_index(index, archive=None):
+    path = index_path(archive)
+    temporary = path + ".tmp"
+    index.sort_values("Day").to_csv(temporary, index=False, date_format="%Y-%m-%d %H:%M:%S")
+    os.replace(temporary, path)
+
+def day_files(directory):
+    # One file per day, the exported workbook wins over the CSV it was made from
+    files = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*_data.csv")) + glob.glob(os.path.join(directory, "*_data.xlsx"))):
+        files[os.path.basename(path)[:10]] = os.path.basename(path)
+    return [files[day] for day in sorted(files)]
+
+def prepare_day(df, day):
+    # The day files only carry the time of day, the partition gets full timestamps, past
+    # midnight on the next day
+    df = df.copy(deep=False)
+    df["Timestamp"] = sample_times(df, day)
+    df = df.sort_values("Timestamp", kind="stable").reset_index(drop=True)
+    for column in df.columns:
+        # Mixed text columns from older workbooks would not make a consistent schema
+        if df[column].dtype == object:
+            df[column] = df[column].astype("string")
+    return df
+
+def ingest_day(directory, filename, archive=None):
+    day = filename[:10]
+    # Each day is read once, so it is not kept in the worker's memo of loaded days
+    df = prepare_day(load_day(directory, filename, memo=False), day)
+    path = partition_path(day, archive)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + ".tmp"
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temporary, row_group_size=details.ARCHIVE_BATCH_ROWS)
+    os.replace(temporary, path)
+    clouds = df["Cloud Coverage"] if "Cloud Coverage" in df.columns else pd.Series(dtype=np.float64)
+    weather = sorted(df["Weather"].dropna().astype(str).unique()) if "Weather" in df.columns else []
+    return {
+        "Day": day,
+        "Path": os.path.relpath(path, archive_path(archive)),
+        "Source": filename,
+        "Source Key": cache_key(os.path.join(directory, filename)),
+        "Rows": len(df),
+        "First": df["Timestamp"].min(),
+        "Last": df["Timestamp"].max(),
+        "Cloud Min": clouds.min(),
+        "Cloud Max": clouds.max(),
+        "Cloud Mean": clouds.mean(),
+        "Weather": ";".join(weather),
+        "Quarantined": len(load_rejected(directory, filename, memo=False)),
+    }
+
+def ingest(directory=None, filenames=None, archive=None, workers=None):
+    # Adds new or changed day files; a day already archived from the same file is skipped
+    directory = details.BASE_PATH if directory is None else directory
+    filenames = day_files(directory) if filenames is None else filenames
+    os.makedirs(archive_path(archive), exist_ok=True)
+    index = read_index(archive)
+    known = dict(zip(index["Day"], index["Source Key"]))
+    todo = [filename for filename in filenames if known.get(filename[:10]) != cache_key(os.path.join(directory, filename))]
+    if not todo:
+        return index
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        entries = list(executor.map(ingest_day, [directory] * len(todo), todo, [archive] * len(todo)))
+    for entry in entries:
+        print(f"Archived {entry['Source']}: {entry['Rows']} rows, {entry['Quarantined']} quarantined")
+    days = {entry["Day"] for entry in entries}
+    index = pd.concat([index[~index["Day"].isin(days)], pd.DataFrame(entries)], ignore_index=True)
+    write_index(index, archive)
+    return index
+
+def select_partitions(index, start=None, end=None, clouds=None, weather=None):
+    # Index lines whose partition can hold matching rows, without opening any of them
+    keep = pd.Series(True, index=index.index)
+    if start is not None:
+        keep &= index["Last"] >= pd.Timestamp(start)
+    if end is not None:
+        keep &= index["First"] <= pd.Timestamp(end)
+    if clouds is not None:
+        keep &= (index["Cloud Max"] >= clouds[0]) & (index["Cloud Min"] <= clouds[1])
+    if weather is not None:
+        keep &= index["Weather"].str.split(";").apply(lambda types: weather in types)
+    return index[keep]
+
+def scan(columns=None, start=None, end=None, clouds=None, weather=None, archive=None, batch_rows=None):
+    # Yields DataFrames of at most batch_rows matching rows, one partition row group at a time
+    batch_rows = details.ARCHIVE_BATCH_ROWS if batch_rows is None else batch_rows
+    index = select_partitions(read_index(archive), start, end, clouds, weather)
+    filters = {"Timestamp"}
+    if clouds is not None:
+        filters.add("Cloud Coverage")
+    if weather is not None:
+        filters.add("Weather")
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + sorted(filters)))
+    for path in index.sort_values("Day")["Path"]:
+        parquet_file = pq.ParquetFile(os.path.join(archive_path(archive), path))
+        names = None if read_columns is None else [name for name in read_columns if name in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=names):
+            df = batch.to_pandas()
+            keep = np.ones(len(df), dtype=bool)
+            if start is not None:
+                keep &= (df["Timestamp"] >= pd.Timestamp(start)).to_numpy()
+            if end is not None:
+                keep &= (df["Timestamp"] <= pd.Timestamp(end)).to_numpy()
+            if clouds is not None:
+                keep &= df["Cloud Coverage"].between(*clouds).to_numpy()
+            if weather is not None:
+                keep &= (df["Weather"] == weather).to_numpy()
+            if keep.any():
+                yield df[keep] if not keep.all() else df
+
+def grouped_means(by, columns, chunks):
+    # Running sums and counts per group, so only the groups are kept between chunks.
+    # by is a function of a chunk returning its group labels.
+    sums = None
+    for df in chunks:
+        labels = by(df)
+        values = df[columns].astype(np.float64)
+        partial = pd.concat([values.groupby(labels).sum(min_count=1).fillna(0),
+                             values.notna().groupby(labels).sum().add_suffix("|count")], axis=1)
+        sums = partial if sums is None else sums.add(partial, fill_value=0)
+    if sums is None:
+        return pd.DataFrame(columns=columns + ["Rows"])
+    means = pd.DataFrame({column: sums[column] / sums[f"{column}|count"] for column in columns})
+    means["Rows"] = sums[[f"{column}|count" for column in columns]].max(axis=1).astype(np.int64)
+    return means.sort_index()
+
+def tracking_gain_by_cloud(start=None, end=None, bucket=10, archive=None, daylight=0.0):
+    # Mean panel power and the gain over the fixed panel per cloud coverage bucket. Rows where
+    # the fixed panel makes no more than daylight watts (night) are left out.
+    power = ["Fixed Panel Power(W)", "SPA Panel Power(W)", "Tracking Panel Power(W)"]
+    chunks = (df[df["Fixed Panel Power(W)"] > daylight] for df in scan(power + ["Cloud Coverage"], start, end, archive=archive))
+    means = grouped_means(lambda df: (df["Cloud Coverage"] // bucket * bucket).astype("Int64").rename("Cloud Bucket(%)"), power, chunks)
+    means["SPA Gain(%)"] = (means["SPA Panel Power(W)"] / means["Fixed Panel Power(W)"] - 1) * 100
+    means["Tracking Gain(%)"] = (means["Tracking Panel Power(W)"] / means["Fixed Panel Power(W)"] - 1) * 100
+    return means
+
+if __name__ == "__main__":
+    # python DataArchive.py ingest                 archive every day file in BASE_PATH
+    # python DataArchive.py index                  list the archived days
+    # python DataArchive.py gain --from 2024-01-01 --to 2024-12-31
+    parser = argparse.ArgumentParser(description="Archive logged days and query across them")
+    parser.add_argument("command", choices=["ingest", "index", "gain"])
+    parser.add_argument("files", nargs="*", help="day files to ingest, defaults to all in BASE_PATH")
+    parser.add_argument("--from", dest="start")
+    parser.add_argument("--to", dest="end")
+    parser.add_argument("--bucket", type=int, default=10, help="cloud coverage bucket width in percent")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    pd.set_option("display.width", 200)
+    if args.command == "ingest":
+        index = ingest(filenames=args.files or None, workers=args.workers)
+        print(f"{len(index)} days in {archive_path()}")
+    elif args.command == "index":
+        print(read_index().drop(columns=["Path", "Source Key"]).to_string(index=False))
+    else:
+        end = args.end
+        if end is not None and len(end) == 10:
+            # A bare date includes that whole day
+            end = pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+        print(tracking_gain_by_cloud(args.start, end, args.bucket))
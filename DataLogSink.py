@@ -0,0 +1,134 @@
+import os
+import csv
+import time
+import sys
+import pandas as pd
+from datetime import datetime
+import details
+import LoggerMetrics
+
+# Rows are appended to a daily CSV file instead of re-reading and re-writing the whole
+# day's workbook for every sample. The .xlsx that GraphingScript reads is produced once,
+# when the day rolls over or the logger stops. Rows from the pipeline go in the file of the
+# day they were received, so rows held over midnight (e.g. by a failed sink) still land in
+# the right day.
+
+def generate_file_name(day=None, extension="xlsx", base_path=None):
+    if day is None:
+        day = datetime.today().strftime("%Y-%m-%d")
+    if base_path is None:
+        base_path = details.BASE_PATH
+    file_path = os.path.join(base_path, f"{day}_data.{extension}")
+    return file_path
+
+def row_day(row):
+    received = row.get("Time Recieved")
+    if isinstance(received, datetime):
+        return received.strftime("%Y-%m-%d")
+    return datetime.today().strftime("%Y-%m-%d")
+
+def extend_header(file_name, columns):
+    # Rewrites a day file under a wider header, the older rows get blanks in the new columns
+    temporary = file_name + ".tmp"
+    with open(file_name, newline="") as existing, open(temporary, "w", newline="") as widened:
+        writer = csv.DictWriter(widened, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(csv.DictReader(existing))
+    os.replace(temporary, file_name)
+
+def export_to_excel(day, base_path=None):
+    csv_name = generate_file_name(day, "csv", base_path)
+    if not os.path.isfile(csv_name):
+        return None
+    df = pd.read_csv(csv_name)
+    if "Time Recieved" in df.columns:
+        df["Time Recieved"] = pd.to_datetime(df["Time Recieved"], format="ISO8601")
+    excel_name = generate_file_name(day, "xlsx", base_path)
+    df.to_excel(excel_name, index=False)
+    print(f"Day {day} exported to {excel_name}")
+    return excel_name
+
+class LogSink:
+    def __init__(self, base_path=None, flush_rows=None, flush_seconds=None, export_excel=None, metrics=None):
+        self.base_path = details.BASE_PATH if base_path is None else base_path
+        self.flush_rows = details.LOG_FLUSH_ROWS if flush_rows is None else flush_rows
+        self.flush_seconds = details.LOG_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.export_excel = details.LOG_EXPORT_EXCEL if export_excel is None else export_excel
+        self.buffer = []
+        self.current_day = None
+        self.last_flush = time.monotonic()
+        self.metrics = LoggerMetrics.metrics if metrics is None else metrics
+
+    def append(self, data):
+        # Accept the same shapes check_and_update_excel did: a dict of scalars or lists
+        if isinstance(data, dict):
+            if any(isinstance(value, list) for value in data.values()):
+                rows = pd.DataFrame.from_dict({key: value if isinstance(value, list) else [value] for key, value in data.items()}).to_dict("records")
+            else:
+                rows = [data]
+        else:
+            rows = pd.DataFrame(data).to_dict("records")
+        # The rows are buffered before anything that can fail, so a failed append always
+        # leaves them in the buffer for whoever takes over (LoggerSupervisor)
+        self.buffer.extend(rows)
+        if not rows:
+            return
+        day = row_day(rows[-1])
+        if self.current_day is not None and day != self.current_day:
+            self.rollover()
+        self.current_day = day
+
+        if len(self.buffer) >= self.flush_rows or (time.monotonic() - self.last_flush) >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        # One file per day in the buffer, rows leave the buffer once their day is written
+        while self.buffer:
+            day = row_day(self.buffer[0])
+            self.write_day(day, [row for row in self.buffer if row_day(row) == day])
+            self.buffer = [row for row in self.buffer if row_day(row) != day]
+
+    def write_day(self, day, rows):
+        file_name = generate_file_name(day, "csv", self.base_path)
+
+        # Keep the column order of the existing file so a restarted logger appends cleanly.
+        # A file from an older logger without some of the columns (e.g. Weather Age(s) or
+        # Device) is widened first, rather than dropping them.
+        row_columns = list(dict.fromkeys(column for row in rows for column in row))
+        columns = None
+        if os.path.isfile(file_name) and os.path.getsize(file_name) > 0:
+            with open(file_name, newline="") as existing:
+                columns = next(csv.reader(existing), None)
+        write_header = columns is None
+        if columns is None:
+            columns = row_columns
+        added = [column for column in row_columns if column not in columns]
+        if added:
+            columns = columns + added
+            extend_header(file_name, columns)
+            print(f"Added columns {added} to {file_name}")
+
+        with self.metrics.time("flush"), open(file_name, "a", newline="") as log_file:
+            writer = csv.DictWriter(log_file, fieldnames=columns)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(rows)
+        print(f"{len(rows)} rows saved to {file_name}")
+
+    def rollover(self):
+        # Writes every buffered day, then exports the one that has finished
+        self.flush()
+        if self.export_excel and self.current_day is not None:
+            with self.metrics.time("export"):
+                export_to_excel(self.current_day, self.base_path)
+
+    def close(self):
+        self.rollover()
+
+if __name__ == "__main__":
+    # Export one or more logged days to .xlsx, e.g. python DataLogSink.py 2024-04-16
+    days = sys.argv[1:] or [datetime.today().strftime("%Y-%m-%d")]
+    for day in days:
+        if export_to_excel(day) is None:
+            print(f"No log found for {day}")
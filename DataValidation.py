@@ -0,0 +1,232 @@
+import os
+import sys
+import csv
+import math
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import details
+from LoggingPipeline import RECORD_COLUMNS
+from EnergyAccounting import sample_time, sample_times
+
+# Checks on logged records, once per record as the logger receives them (RecordValidator) and
+# over whole tables of logged days (validate_frame). A record is rejected when
+#   - it does not have the 20 fields, or a field is not a number (parse_record)
+#   - Time Logged is not HH:MM:SS
+#   - a value is outside RANGES
+#   - its time jumps back, or more than VALIDATION_MAX_STEP seconds forward, from the last
+#     accepted row. The jumped row is set aside and the next one decides: a row carrying on
+#     from the last accepted time shows the jump was one bad stamp, a row carrying on from
+#     the jumped time shows the clock really moved (e.g. an NTP resync or a logging gap) and
+#     is accepted from there. Either way one bad stamp costs one row, not the rest of the day.
+#   - it repeats the previous accepted row exactly, time included. The ASCII record has no
+#     sequence number, so a resent row looks the same as a second identical sample in the
+#     same second; either way it adds nothing (no time step, same values) and is set aside.
+#     Identical rows in different seconds, like flat night rows, are all kept.
+# Time Logged has no date. Rows are dated as in EnergyAccounting, from Time Recieved or, for
+# days logged without it, from the day itself with the clock running past midnight moving
+# the rest to the next day, so a rollover is never taken for time going backwards.
+# Rejected rows are kept with the reason: the logger appends them to <date>_quarantine.csv in
+# BASE_PATH. Day files are checked when DatasetCache first parses them, which keeps their
+# rejected rows in the cache (load_rejected); python DataValidation.py <day file> writes
+# them to <day file>_quarantine.csv. The table checks are vectorized, reprocessing months of
+# days does no Python work per row, only per time jump.
+
+# Inclusive bounds, the other fields only have to be finite
+RANGES = {
+    "Just Calculated": (0, 1),
+    "Fixed Panel Power(W)": (0, math.inf),
+    "SPA Panel Power(W)": (0, math.inf),
+    "Tracking Panel Power(W)": (0, math.inf),
+    "SPA Azimuth": (0, 360),
+    "SPA Zenith": (0, 180),
+    "Spa Panel Rotate": (0, 180),
+    # 90 - zenith as the board computes it, only the servo clamps it, so below 0 at night
+    "Spa Panel Tilt": (-90, 90),
+    "Tracking Panel Rotate": (0, 180),
+    "Tracking Panel Tilt": (0, 90),
+}
+VALUE_COLUMNS = RECORD_COLUMNS[1:]
+LOWER = np.array([RANGES.get(column, (-math.inf, math.inf))[0] for column in VALUE_COLUMNS], dtype=np.float64)
+UPPER = np.array([RANGES.get(column, (-math.inf, math.inf))[1] for column in VALUE_COLUMNS], dtype=np.float64)
+
+BAD_TIME = "Time Logged is not HH:MM:SS"
+BACKWARDS = "time went backwards"
+JUMPED = "time jumped forward"
+DUPLICATE = "duplicate"
+
+def quarantine_file_name(day, base_path=None):
+    base_path = details.BASE_PATH if base_path is None else base_path
+    return os.path.join(base_path, f"{day}_quarantine.csv")
+
+def day_quarantine_path(filepath):
+    return os.path.splitext(filepath)[0] + "_quarantine.csv"
+
+def value_problem(column, value):
+    if not math.isfinite(value):
+        return f"{column} is not a number"
+    low, high = RANGES.get(column, (-math.inf, math.inf))
+    if not low <= value <= high:
+        return f"{column} out of range"
+    return None
+
+def time_problem(sampled, last, max_step):
+    if sampled < last:
+        return BACKWARDS
+    if sampled - last > max_step:
+        return JUMPED
+    return None
+
+class RecordValidator:
+    def __init__(self, base_path=None, max_step=None):
+        self.base_path = details.BASE_PATH if base_path is None else base_path
+        max_step = details.VALIDATION_MAX_STEP if max_step is None else max_step
+        self.max_step = timedelta(seconds=max_step)
+        self.last = None
+        # Time of the previous record if it was set aside for a jump, a record carrying on
+        # from it confirms the jump
+        self.jumped = None
+        self.accepted = 0
+        self.rejected = {}
+
+    def problem(self, record, timeRecieved):
+        if len(record) != len(RECORD_COLUMNS):
+            return "field count"
+        try:
+            sampled = sample_time({"Time Recieved": timeRecieved, "Time Logged": record[0]})
+        except (ValueError, TypeError):
+            return BAD_TIME
+        for column, value in zip(VALUE_COLUMNS, record[1:]):
+            problem = value_problem(column, value)
+            if problem is not None:
+                return problem
+        if self.last is not None:
+            last_sampled, last_record = self.last
+            problem = time_problem(sampled, last_sampled, self.max_step)
+            if problem is not None and (self.jumped is None or time_problem(sampled, self.jumped, self.max_step) is not None):
+                self.jumped = sampled
+                return problem
+            self.jumped = None
+            if sampled == last_sampled and tuple(record) == last_record:
+                return DUPLICATE
+        self.last = (sampled, tuple(record))
+        return None
+
+    def check(self, record, timeRecieved):
+        # None for a good record, otherwise why it was rejected
+        problem = self.problem(record, timeRecieved)
+        if problem is None:
+            self.accepted += 1
+        return problem
+
+    def quarantine(self, record, timeRecieved, reason):
+        # The record as it was received, a line that did not parse or a parsed record
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        line = record if isinstance(record, str) else ",".join(str(value) for value in record)
+        file_name = quarantine_file_name(f"{timeRecieved:%Y-%m-%d}", self.base_path)
+        try:
+            new_file = not os.path.isfile(file_name)
+            with open(file_name, "a", newline="") as quarantine_file:
+                writer = csv.writer(quarantine_file)
+                if new_file:
+                    writer.writerow(["Time Recieved", "Reason", "Record"])
+                writer.writerow([timeRecieved.isoformat(), reason, line])
+        except OSError as e:
+            print(f"Failed to quarantine record: {e}")
+
+    def stats(self):
+        rejected = dict(self.rejected)
+        return {"accepted": self.accepted, "rejected": sum(rejected.values()), "reasons": rejected}
+
+def validate_frame(df, day=None, max_step=None):
+    # The same checks over a whole table, each row getting the first check it fails.
+    # Returns the rows that pass, with numeric record columns, and the rejected rows with a
+    # Reason column.
+    reasons = np.full(len(df), "", dtype=object)
+    times = sample_times(df, day)
+    reasons[times.isna().to_numpy()] = BAD_TIME
+
+    columns = [column for column in VALUE_COLUMNS if column in df.columns]
+    positions = [VALUE_COLUMNS.index(column) for column in columns]
+    values = df[columns].apply(pd.to_numeric, errors="coerce")
+    numbers = values.to_numpy(np.float64)
+    not_number = ~np.isfinite(numbers)
+    bad = not_number | (numbers < LOWER[positions]) | (numbers > UPPER[positions])
+    first = bad.argmax(axis=1)
+    rows = bad.any(axis=1) & (reasons == "")
+    names = np.array(columns, dtype=object)[first[rows]]
+    reasons[rows] = np.where(not_number[rows, first[rows]], names + " is not a number", names + " out of range")
+
+    # A row that steps on from the previous open row is accepted, whether that row was accepted
+    # or set aside for a jump (which it then confirms). Only the rows that jump from the
+    # previous one are walked, against the last accepted time, as check does.
+    max_step = (details.VALIDATION_MAX_STEP if max_step is None else max_step) * 10**9
+    stamps = times.to_numpy("datetime64[ns]").astype(np.int64)
+    open_positions = np.flatnonzero(reasons == "")
+    open_stamps = stamps[open_positions]
+    steps = np.diff(open_stamps)
+    accepted = np.ones(len(open_positions), dtype=bool)
+    last = None
+    for row in np.flatnonzero((steps < 0) | (steps > max_step)) + 1:
+        if accepted[row - 1]:
+            last = open_stamps[row - 1]
+        problem = time_problem(open_stamps[row], last, max_step)
+        if problem is not None:
+            accepted[row] = False
+            reasons[open_positions[row]] = problem
+
+    # Each row against the previous row still open. A run of copies all match the first of
+    # them, so this is the same as comparing with the previous accepted row, as check does.
+    open_positions = np.flatnonzero(reasons == "")
+    keys = np.column_stack([numbers[open_positions], stamps[open_positions]])
+    same = np.zeros(len(open_positions), dtype=bool)
+    same[1:] = (keys[1:] == keys[:-1]).all(axis=1)
+    reasons[open_positions[same]] = DUPLICATE
+
+    keep = reasons == ""
+    clean = df[keep].copy()
+    for column in columns:
+        if not pd.api.types.is_numeric_dtype(clean[column]):
+            clean[column] = values.loc[keep, column]
+    rejected = df[~keep].assign(Reason=reasons[~keep])
+    for column in rejected.columns:
+        # Rejected values can be anything, as text they fit one column type for the cache
+        if rejected[column].dtype == object:
+            rejected[column] = rejected[column].astype("string")
+    return clean.reset_index(drop=True), rejected.reset_index(drop=True)
+
+def validate_day(filepath, df):
+    # validate_frame dated from the day in the file name. Nothing is written, the caller
+    # decides what to do with the rejected rows.
+    try:
+        day = pd.Timestamp(os.path.basename(filepath)[:10])
+    except ValueError:
+        day = None
+    return validate_frame(df, day)
+
+def write_quarantine(filepath, rejected):
+    # <day file>_quarantine.csv with the rejected rows, or no file when there are none
+    path = day_quarantine_path(filepath)
+    if len(rejected):
+        rejected.to_csv(path, index=False)
+    elif os.path.isfile(path):
+        os.remove(path)
+    return path
+
+def reason_counts(rejected):
+    return ", ".join(f"{reason} {count}" for reason, count in rejected["Reason"].value_counts().items())
+
+if __name__ == "__main__":
+    # Checks logged days and writes their rejected rows next to them,
+    # e.g. python DataValidation.py 2024-04-16_data.xlsx
+    from DatasetCache import read_day
+    filenames = sys.argv[1:]
+    if not filenames:
+        print("Usage: python DataValidation.py <day file> [<day file> ...]")
+        sys.exit(1)
+    for filename in filenames:
+        filepath = os.path.join(details.BASE_PATH, filename)
+        df = read_day(filepath)
+        clean, rejected = validate_day(filepath, df)
+        path = write_quarantine(filepath, rejected)
+        print(f"{filename}: {len(clean)} of {len(df)} rows passed" + (f", {len(rejected)} rejected to {path} ({reason_counts(rejected)})" if len(rejected) else ""))
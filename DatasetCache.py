@@ -0,0 +1,120 @@
+import os
+import glob
+import pickle
+import hashlib
+from collections import OrderedDict
+import pandas as pd
+import details
+from DataValidation import validate_day
+
+# Each logged day is parsed from its workbook once and kept as a typed columnar file in a
+# .cache folder next to it. The cache file name carries a key made from the source path,
+# modification time and size, so editing or re-exporting a day invalidates it automatically.
+# Rows that fail the checks in DataValidation are left out of the cached table and cached on
+# their own with the reason (load_rejected); nothing is written next to the day file.
+# The last CACHE_MEMO_TABLES tables loaded stay in memory as well, for charts that come back
+# to the same day. Readers that go through every day once (archive ingest, the simulator)
+# pass memo=False so memory does not grow with the number of days.
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_EXTENSION = "parquet"
+except ImportError:
+    CACHE_EXTENSION = "pkl"
+
+# Part of the key, changed whenever parse_day returns something different for the same file
+CACHE_VERSION = 3
+
+loaded_days = OrderedDict()
+
+def cache_key(filepath):
+    stat = os.stat(filepath)
+    key = f"{os.path.abspath(filepath)}|{stat.st_mtime_ns}|{stat.st_size}|{CACHE_VERSION}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+def cache_path(filepath, key, suffix=""):
+    # The stem keeps the source extension, a day's workbook and the CSV it was made from do
+    # not share cache files
+    directory, filename = os.path.split(filepath)
+    return os.path.join(directory, ".cache", f"{filename}{suffix}-{key}.{CACHE_EXTENSION}")
+
+def write_cache(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    stem = os.path.basename(path).rsplit("-", 1)[0]
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f"{stem}-*.{CACHE_EXTENSION}")):
+        os.remove(stale)
+    temporary = path + ".tmp"
+    if CACHE_EXTENSION == "parquet":
+        df.to_parquet(temporary, index=False)
+    else:
+        with open(temporary, "wb") as cache_file:
+            pickle.dump(df, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+def read_cache(path):
+    if CACHE_EXTENSION == "parquet":
+        return pd.read_parquet(path)
+    with open(path, "rb") as cache_file:
+        return pickle.load(cache_file)
+
+def read_day(filepath):
+    if filepath.endswith(".csv"):
+        df = pd.read_csv(filepath)
+        if "Time Recieved" in df.columns:
+            df["Time Recieved"] = pd.to_datetime(df["Time Recieved"], format="ISO8601")
+    else:
+        df = pd.read_excel(filepath)
+    return df
+
+def parse_day(filepath):
+    # The rows that pass the checks, with a Timestamp, and the rejected rows with a Reason
+    df, rejected = validate_day(filepath, read_day(filepath))
+    df["Timestamp"] = pd.to_datetime(df["Time Logged"], format="%H:%M:%S")
+    return df, rejected
+
+def remember(entry, df):
+    # Least recently used tables go first
+    loaded_days[entry] = df
+    loaded_days.move_to_end(entry)
+    while len(loaded_days) > details.CACHE_MEMO_TABLES:
+        loaded_days.popitem(last=False)
+
+def build_day(filepath, memo=True):
+    # One parse gives both tables, the rejected rows are cached alongside the day
+    df, rejected = parse_day(filepath)
+    key = cache_key(filepath)
+    write_cache(rejected, cache_path(filepath, key, "_rejected"))
+    if memo:
+        remember((key, "_rejected"), rejected)
+    return df
+
+def load_cached(filepath, suffix, build, memo=True):
+    key = cache_key(filepath)
+    if (key, suffix) in loaded_days:
+        df = loaded_days[(key, suffix)]
+        loaded_days.move_to_end((key, suffix))
+    else:
+        path = cache_path(filepath, key, suffix)
+        if os.path.isfile(path):
+            df = read_cache(path)
+        else:
+            df = build()
+            write_cache(df, path)
+        if memo:
+            remember((key, suffix), df)
+    # Shallow copy so charts can add their own columns without touching the cached frame
+    return df.copy(deep=False)
+
+def load_day(directory, filename, memo=True):
+    filepath = os.path.join(directory, filename)
+    return load_cached(filepath, "", lambda: build_day(filepath, memo), memo)
+
+def load_rejected(directory, filename, memo=True):
+    # Rows of the day that failed the DataValidation checks, with a Reason column
+    filepath = os.path.join(directory, filename)
+    return load_cached(filepath, "_rejected", lambda: parse_day(filepath)[1], memo)
+
+def load_derived(directory, filename, suffix, build, memo=True):
+    # Tables computed from a day (e.g. rollups) cached under the same key as the day itself
+    filepath = os.path.join(directory, filename)
+    return load_cached(filepath, suffix, lambda: build(load_day(directory, filename, memo)), memo)
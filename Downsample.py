@@ -0,0 +1,46 @@
+import numpy as np
+
+# Largest-Triangle-Three-Buckets (Steinarsson, 2013): keeps the first and last samples and,
+# from each of max_points - 2 equal buckets in between, the sample that makes the largest
+# triangle with the one kept from the previous bucket and the mean of the next bucket.
+# Peaks and dips survive, which a plain stride or a bucket mean would flatten, so a plot of
+# a few thousand points looks the same as one of the whole day.
+
+def as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64) or np.issubdtype(values.dtype, np.timedelta64):
+        return values.astype("datetime64[ns]" if values.dtype.kind == "M" else "timedelta64[ns]").astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+def lttb_indices(x, y, max_points):
+    # Row positions to keep, in order; every row if there are not more than max_points
+    n = len(y)
+    if not max_points or max_points >= n or max_points < 3:
+        return np.arange(n)
+    xs = as_float(x)
+    ys = np.nan_to_num(as_float(y))
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    keep = np.empty(max_points, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x = xs[end:edges[i + 2]].mean()
+            next_y = ys[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = xs[n - 1], ys[n - 1]
+        # Twice the triangle area, the constant factor does not change which one is largest
+        area = np.abs((xs[a] - next_x) * (ys[start:end] - ys[a]) - (xs[a] - xs[start:end]) * (next_y - ys[a]))
+        a = start + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+def lttb(x, y, max_points):
+    # x and y thinned to at most max_points samples, pandas Series keep their type
+    keep = lttb_indices(x, y, max_points)
+    if len(keep) == len(y):
+        return x, y
+    take = lambda values: values.iloc[keep] if hasattr(values, "iloc") else np.asarray(values)[keep]
+    return take(x), take(y)
@@ -0,0 +1,211 @@
+import os
+import sys
+import csv
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import details
+
+# Energy for the three panels, integrated row by row as the logger writes them instead of
+# summing 15 minute means after the day is over. Each pair of consecutive rows adds a
+# trapezoid over their actual logged times, split at hour boundaries, and a pair further
+# apart than ENERGY_MAX_GAP seconds (logger or board down) is counted as a gap rather than
+# bridged. Every "Just Calculated" row is one run of trackingCall, which costs
+# SERVO_ENERGY_PER_RUN Wh for the SPA and the tracking panel each (derived in the details file;
+# TotalPower takes the same figure off the day's average power in W).
+# Hourly totals are kept per day in <date>_energy.csv in BASE_PATH, rewritten every
+# ENERGY_FLUSH_SECONDS, and picked up again if the logger restarts during the day.
+
+PANELS = {
+    "Fixed": "Fixed Panel Power(W)",
+    "SPA": "SPA Panel Power(W)",
+    "Tracking": "Tracking Panel Power(W)",
+}
+
+# Per hour: energy for each panel, tracking runs, seconds integrated, seconds in gaps
+TOTAL_COLUMNS = [f"{panel} Energy(Wh)" for panel in PANELS] + ["Tracking Runs", "Covered(s)", "Gaps(s)"]
+RUNS, COVERED, GAPS = 3, 4, 5
+
+def energy_file_name(day, base_path=None):
+    base_path = details.BASE_PATH if base_path is None else base_path
+    return os.path.join(base_path, f"{day}_energy.csv")
+
+def sample_time(row):
+    # Time Logged is when the board sampled the row, Time Recieved gives it a date. Near
+    # midnight the two can fall either side of it.
+    received = row["Time Recieved"]
+    if isinstance(received, str):
+        received = datetime.fromisoformat(received)
+    elif isinstance(received, pd.Timestamp):
+        received = received.to_pydatetime()
+    hour, minute, second = (int(part) for part in str(row["Time Logged"]).split(':'))
+    sampled = received.replace(hour=hour, minute=minute, second=second, microsecond=0)
+    if sampled - received > timedelta(hours=12):
+        sampled -= timedelta(days=1)
+    elif received - sampled > timedelta(hours=12):
+        sampled += timedelta(days=1)
+    return sampled
+
+def sample_times(df, day=None):
+    # sample_time for a whole table, NaT where Time Logged is not HH:MM:SS. Days logged without
+    # Time Recieved are dated from day, and each time the clock runs back past midnight the
+    # rows after it move to the next day.
+    clock = pd.to_datetime(df["Time Logged"].astype(str), format="%H:%M:%S", errors="coerce")
+    of_day = clock - clock.dt.normalize()
+    if "Time Recieved" in df.columns:
+        received = pd.to_datetime(df["Time Recieved"], format="ISO8601", errors="coerce")
+        sampled = received.dt.normalize() + of_day
+        ahead = sampled - received
+        sampled = sampled.where(ahead <= pd.Timedelta(hours=12), sampled - pd.Timedelta(days=1))
+        return sampled.where(ahead >= -pd.Timedelta(hours=12), sampled + pd.Timedelta(days=1))
+    steps = of_day.dropna().diff().reindex(of_day.index)
+    days = (steps < -pd.Timedelta(hours=12)).astype(np.int64) - (steps > pd.Timedelta(hours=12)).astype(np.int64)
+    return pd.Timestamp(day or "1900-01-01") + of_day + pd.to_timedelta(days.cumsum(), unit="D")
+
+class EnergyAccumulator:
+    def __init__(self, base_path=None, max_gap=None, servo_energy=None, flush_seconds=None, persist=True):
+        self.base_path = details.BASE_PATH if base_path is None else base_path
+        self.max_gap = details.ENERGY_MAX_GAP if max_gap is None else max_gap
+        self.servo_energy = details.SERVO_ENERGY_PER_RUN if servo_energy is None else servo_energy
+        self.flush_seconds = details.ENERGY_FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self.persist = persist
+        self.hours = {}
+        self.loaded_days = set()
+        self.dirty_days = set()
+        self.last = None
+        self.last_flush = time.monotonic()
+        self.rows = 0
+        self.skipped = 0
+
+    def bucket(self, hour):
+        day = f"{hour:%Y-%m-%d}"
+        if day not in self.loaded_days:
+            self.loaded_days.add(day)
+            if self.persist:
+                self.load(day)
+        if hour not in self.hours:
+            self.hours[hour] = np.zeros(len(TOTAL_COLUMNS))
+        self.dirty_days.add(day)
+        return self.hours[hour]
+
+    def integrate(self, t0, p0, t1, p1):
+        span = (t1 - t0).total_seconds()
+        start = t0
+        while start < t1:
+            hour = start.replace(minute=0, second=0, microsecond=0)
+            end = min(hour + timedelta(hours=1), t1)
+            # Power where the interval is cut at an hour boundary, on the line between the rows
+            p_start = p0 + (p1 - p0) * ((start - t0).total_seconds() / span)
+            p_end = p0 + (p1 - p0) * ((end - t0).total_seconds() / span)
+            seconds = (end - start).total_seconds()
+            totals = self.bucket(hour)
+            totals[:len(PANELS)] += (p_start + p_end) / 2 * seconds / 3600
+            totals[COVERED] += seconds
+            start = end
+
+    def add_sample(self, when, powers, calculated):
+        powers = np.asarray(powers, dtype=np.float64)
+        if calculated:
+            self.bucket(when.replace(minute=0, second=0, microsecond=0))[RUNS] += 1
+        if self.last is not None:
+            last_when, last_powers = self.last
+            seconds = (when - last_when).total_seconds()
+            if seconds < 0:
+                # Out of order (e.g. stamped before a tracking run), keep the later row as the reference
+                self.skipped += 1
+                return
+            if seconds > self.max_gap:
+                self.bucket(last_when.replace(minute=0, second=0, microsecond=0))[GAPS] += seconds
+            elif seconds > 0:
+                self.integrate(last_when, last_powers, when, powers)
+        self.last = (when, powers)
+        self.rows += 1
+
+    def add(self, row):
+        # Same dict the pipeline hands to the sink
+        try:
+            when = sample_time(row)
+            powers = [float(row[column]) for column in PANELS.values()]
+            calculated = int(row["Just Calculated"])
+        except (KeyError, ValueError, TypeError):
+            self.skipped += 1
+            return
+        self.add_sample(when, powers, calculated)
+        if self.persist and (time.monotonic() - self.last_flush) >= self.flush_seconds:
+            self.flush()
+
+    def table(self, day=None):
+        # Hourly totals, for one day or everything seen, with the servo cost and net energy
+        hours = sorted(hour for hour in list(self.hours) if day is None or f"{hour:%Y-%m-%d}" == day)
+        df = pd.DataFrame([self.hours[hour] for hour in hours], columns=TOTAL_COLUMNS,
+                          index=pd.DatetimeIndex(hours, name="Hour"))
+        df["Tracking Runs"] = df["Tracking Runs"].astype(np.int64)
+        df["Servo Energy(Wh)"] = df["Tracking Runs"] * self.servo_energy
+        df["SPA Net Energy(Wh)"] = df["SPA Energy(Wh)"] - df["Servo Energy(Wh)"]
+        df["Tracking Net Energy(Wh)"] = df["Tracking Energy(Wh)"] - df["Servo Energy(Wh)"]
+        return df
+
+    def daily(self):
+        df = self.table()
+        return df.groupby(df.index.normalize().rename("Day")).sum()
+
+    def load(self, day):
+        # Totals written before a restart; the interval across the restart itself is not counted
+        file_name = energy_file_name(day, self.base_path)
+        if not os.path.isfile(file_name):
+            return
+        with open(file_name, newline="") as energy_file:
+            for line in csv.DictReader(energy_file):
+                hour = datetime.fromisoformat(line["Hour"])
+                self.hours[hour] = np.array([float(line[column]) for column in TOTAL_COLUMNS])
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        for day in sorted(self.dirty_days):
+            file_name = energy_file_name(day, self.base_path)
+            temporary = file_name + ".tmp"
+            self.table(day).to_csv(temporary, date_format="%Y-%m-%d %H:%M:%S")
+            os.replace(temporary, file_name)
+        self.dirty_days.clear()
+
+    def close(self):
+        if self.persist:
+            self.flush()
+
+    def stats(self):
+        # Running totals for the current day, for the pipeline stats and metrics snapshot
+        stats = {"rows": self.rows, "skipped": self.skipped}
+        if self.last is not None:
+            today = self.table(f"{self.last[0]:%Y-%m-%d}").sum()
+            for column in ["Fixed Energy(Wh)", "SPA Net Energy(Wh)", "Tracking Net Energy(Wh)", "Tracking Runs", "Gaps(s)"]:
+                stats[column] = round(float(today[column]), 6)
+        return stats
+
+def accumulate_day(df, day=None, **options):
+    # Runs a whole logged day through the accumulator, for days logged before it existed.
+    # Days without a Time Recieved column need the date given.
+    # The times and powers are converted for the whole day at once, only the integration
+    # itself goes row by row.
+    accumulator = EnergyAccumulator(persist=False, **options)
+    times = sample_times(df, day)
+    powers = df[list(PANELS.values())].apply(pd.to_numeric, errors="coerce").to_numpy(np.float64)
+    calculated = pd.to_numeric(df["Just Calculated"], errors="coerce").to_numpy(np.float64)
+    valid = times.notna().to_numpy() & np.isfinite(powers).all(axis=1) & np.isfinite(calculated)
+    accumulator.skipped += int((~valid).sum())
+    for when, row_powers, calc in zip(times[valid], powers[valid], calculated[valid]):
+        accumulator.add_sample(when.to_pydatetime(), row_powers, int(calc))
+    return accumulator
+
+if __name__ == "__main__":
+    # Energy for logged days, e.g. python EnergyAccounting.py 2024-04-16_data.xlsx
+    from DatasetCache import load_day
+    filenames = sys.argv[1:]
+    if not filenames:
+        print("Usage: python EnergyAccounting.py <day file> [<day file> ...]")
+        sys.exit(1)
+    pd.set_option("display.width", 200)
+    for filename in filenames:
+        accumulator = accumulate_day(load_day(details.BASE_PATH, filename), filename[:10])
+        print(accumulator.table())
+        print(accumulator.daily().T)
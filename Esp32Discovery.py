@@ -0,0 +1,109 @@
+import time
+import socket
+import base64
+import requests
+import details
+import LoggerMetrics
+
+# Resolvers each return the ESP32's IP address as a string, or None if they could not find it.
+# CachedEsp32Address tries them in order and keeps the answer until the TTL runs out or the
+# logger reports that connecting to it failed. When every resolver fails the last known address
+# is kept and the lookup is not tried again for ESP32_IP_RETRY seconds, however often the
+# logger reports failed connections in between.
+
+class GitHubResolver:
+    def __init__(self, username=None, repo=None, file_path=None, token=None, api_base="https://api.github.com"):
+        self.username = details.GITHUB_USERNAME if username is None else username
+        self.repo = details.GITHUB_REPO if repo is None else repo
+        self.file_path = details.GITHUB_FILE_PATH if file_path is None else file_path
+        self.token = details.GITHUB_ACCESS_TOKEN if token is None else token
+        self.api_base = api_base
+
+    def resolve(self):
+        try:
+            headers = {"Authorization": f"token {self.token}"}
+            response = requests.get(f"{self.api_base}/repos/{self.username}/{self.repo}/contents/{self.file_path}", headers=headers, timeout=10)
+            response.raise_for_status()
+
+            content = base64.b64decode(response.json()["content"]).decode("utf-8")
+            return content.strip().split('\n')[0]
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching IP from GitHub: {e}")
+            return None
+
+class StaticResolver:
+    # Fixed address, also the offline stand-in (e.g. "127.0.0.1" with Esp32Emulator)
+    def __init__(self, ip=None):
+        self.ip = details.ESP32_STATIC_IP if ip is None else ip
+
+    def resolve(self):
+        ip = self.ip.strip()
+        return ip or None
+
+class FileResolver:
+    def __init__(self, path=None):
+        self.path = details.ESP32_IP_FILE if path is None else path
+
+    def resolve(self):
+        try:
+            with open(self.path) as ip_file:
+                return ip_file.readline().strip() or None
+        except OSError as e:
+            print(f"Error reading IP from {self.path}: {e}")
+            return None
+
+class MdnsResolver:
+    # Relies on the host resolving .local names (avahi/Bonjour); the sketch does not advertise one yet
+    def __init__(self, hostname=None):
+        self.hostname = details.ESP32_MDNS_HOST if hostname is None else hostname
+
+    def resolve(self):
+        try:
+            return socket.gethostbyname(self.hostname)
+        except OSError as e:
+            print(f"Error resolving {self.hostname}: {e}")
+            return None
+
+RESOLVERS = {
+    "github": GitHubResolver,
+    "static": StaticResolver,
+    "file": FileResolver,
+    "mdns": MdnsResolver,
+}
+
+def build_resolvers(names=None):
+    if names is None:
+        names = details.ESP32_RESOLVERS
+    return [RESOLVERS[name]() for name in names]
+
+class CachedEsp32Address:
+    def __init__(self, resolvers=None, ttl=None, retry=None, metrics=None):
+        self.resolvers = build_resolvers() if resolvers is None else resolvers
+        self.ttl = details.ESP32_IP_TTL if ttl is None else ttl
+        self.retry = details.ESP32_IP_RETRY if retry is None else retry
+        self.ip = None
+        self.expires_at = 0
+        self.retry_at = 0
+        self.lookups = 0
+        self.metrics = LoggerMetrics.metrics if metrics is None else metrics
+
+    def get(self):
+        now = time.monotonic()
+        if (self.ip is not None and now < self.expires_at) or now < self.retry_at:
+            return self.ip
+        for resolver in self.resolvers:
+            self.lookups += 1
+            with self.metrics.time("resolve"):
+                ip = resolver.resolve()
+            if ip:
+                self.ip = ip
+                self.expires_at = time.monotonic() + self.ttl
+                self.retry_at = 0
+                return ip
+        # Keep using the last known address rather than nothing if every resolver failed
+        self.metrics.count("failed_resolves")
+        self.retry_at = time.monotonic() + self.retry
+        return self.ip
+
+    def invalidate(self):
+        self.expires_at = 0
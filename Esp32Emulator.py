@@ -0,0 +1,241 @@
+import os
+import time
+import random
+import socket
+import select
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+from DatasetCache import load_day
+from LoggingPipeline import RECORD_COLUMNS
+from TelemetryFrame import encode_frames
+
+# Stands in for the board by replaying a logged day, so the loggers can be exercised without
+# hardware. Rows go out in the sendData format (or as telemetry_frame.h frames) over TCP, either
+# down one held connection like the streaming sketch or one row per connection like the old
+# one, or over a pseudo-terminal like the Bluetooth link. The gaps between rows follow the
+# logged times divided by speed, and jitter, truncated rows and disconnects can be injected.
+
+def format_record(timeLogged, calc, fields):
+    # Matches sendData: String(value,5) for every float
+    return ",".join([timeLogged, str(int(calc))] + [f"{value:.5f}" for value in fields])
+
+class Replay:
+    def __init__(self, df, speed=1.0, jitter=0.0, truncate=0.0, disconnect=0.0, binary=False, restamp=False, seed=None):
+        df = df.sort_values("Timestamp")
+        self.timeLogged = df["Time Logged"].astype(str).tolist()
+        self.calc = df["Just Calculated"].to_numpy(dtype=np.int64)
+        self.fields = df[RECORD_COLUMNS[2:]].to_numpy(dtype=np.float64)
+        seconds = (df["Timestamp"] - df["Timestamp"].iloc[0]).dt.total_seconds().to_numpy()
+        # speed=None replays as fast as the reader takes rows
+        self.due = seconds / speed if speed else np.zeros(len(seconds))
+        self.jitter = jitter
+        self.truncate = truncate
+        self.disconnect = disconnect
+        self.binary = binary
+        self.restamp = restamp
+        self.random = random.Random(seed)
+        self.sent = 0
+        self.truncated = 0
+        self.disconnects = 0
+
+    @classmethod
+    def from_file(cls, filepath, **options):
+        directory, filename = os.path.split(os.path.abspath(filepath))
+        return cls(load_day(directory, filename), **options)
+
+    def __len__(self):
+        return len(self.timeLogged)
+
+    def payload(self, i):
+        timeLogged = datetime.now().strftime("%H:%M:%S") if self.restamp else self.timeLogged[i]
+        if self.binary:
+            hour, minute, second = (int(part) for part in timeLogged.split(':'))
+            data = encode_frames(i, self.calc[i], hour * 3600 + minute * 60 + second, self.fields[i])
+        else:
+            data = (format_record(timeLogged, self.calc[i], self.fields[i]) + "\r\n").encode()
+        if self.truncate and self.random.random() < self.truncate:
+            # Part of the row is lost and the next one runs straight on from it
+            self.truncated += 1
+            data = data[:self.random.randrange(1, len(data))]
+        return data
+
+    def events(self):
+        # (seconds from the start of the replay, bytes, drop the link after sending)
+        for i in range(len(self)):
+            due = self.due[i]
+            if self.jitter:
+                due = max(due + self.random.uniform(-self.jitter, self.jitter), 0.0)
+            disconnect = bool(self.disconnect) and self.random.random() < self.disconnect
+            self.disconnects += disconnect
+            yield due, self.payload(i), disconnect
+            self.sent += 1
+
+    def stats(self):
+        return {"rows": len(self), "sent": self.sent, "truncated": self.truncated, "disconnects": self.disconnects}
+
+def wait_until(started, due):
+    delay = started + due - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+def peer_closed(conn):
+    # True once the logger has closed its end, e.g. WiFiSource after reading its one record
+    # (or timing out), so the next row waits for the next connection instead
+    readable, _, _ = select.select([conn], [], [], 0)
+    return bool(readable) and conn.recv(1, socket.MSG_PEEK) == b''
+
+class TcpEmulator:
+    def __init__(self, replay, host="127.0.0.1", port=0, mode="stream"):
+        self.replay = replay
+        self.mode = mode
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()
+        self.port = self.address[1]
+        self.connections = 0
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def accept(self):
+        self.server.settimeout(1)
+        while self.running:
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                # close() shut the server socket
+                return None
+            self.connections += 1
+            return conn
+        return None
+
+    def run(self):
+        started = time.monotonic()
+        conn = None
+        try:
+            for due, data, disconnect in self.replay.events():
+                wait_until(started, due)
+                while self.running:
+                    if conn is None:
+                        conn = self.accept()
+                        if conn is None:
+                            return
+                    if self.mode == "connection" and peer_closed(conn):
+                        conn.close()
+                        conn = None
+                        continue
+                    try:
+                        conn.sendall(data)
+                        break
+                    except OSError:
+                        # The logger went away, the row waits for it to come back like on the board
+                        conn.close()
+                        conn = None
+                if conn is not None and (self.mode == "connection" or disconnect):
+                    conn.close()
+                    conn = None
+        finally:
+            if conn is not None:
+                conn.close()
+            self.running = False
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.running = False
+        self.server.close()
+        self.thread.join(timeout=2)
+
+class PtyBoard:
+    # Pseudo-terminal stand-in for the Bluetooth board. Open .port with serial.Serial, lines
+    # are written to it every interval seconds and time messages sent back are collected.
+    def __init__(self, lines, interval=0.0):
+        # pty is POSIX only, imported here so the emulator's TCP modes still load on Windows
+        import pty
+        self.master, self.slave = pty.openpty()
+        self.port = os.ttyname(self.slave)
+        self.lines = lines
+        self.interval = interval
+        self.time_messages = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def collect_time_messages(self):
+        incoming = b''
+        while select.select([self.master], [], [], 0)[0]:
+            incoming += os.read(self.master, 1024)
+        self.time_messages.extend(message.decode() for message in incoming.split(b'\n') if message)
+
+    def run(self):
+        for line in self.lines:
+            self.collect_time_messages()
+            os.write(self.master, line.encode() + b'\r\n')
+            if self.interval:
+                time.sleep(self.interval)
+        self.collect_time_messages()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+class PtyEmulator(PtyBoard):
+    # PtyBoard driven by a Replay. A dropped link goes quiet for outage seconds, which is what
+    # the serial port sees when the Bluetooth connection is lost.
+    def __init__(self, replay, outage=5.0):
+        super().__init__([], 0.0)
+        self.replay = replay
+        self.outage = outage
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            for due, data, disconnect in self.replay.events():
+                wait_until(started, due)
+                self.collect_time_messages()
+                os.write(self.master, data)
+                if disconnect:
+                    time.sleep(self.outage)
+                    started += self.outage
+            self.collect_time_messages()
+        except OSError:
+            # The pty was closed under us
+            pass
+
+if __name__ == "__main__":
+    # e.g. python Esp32Emulator.py 2024-04-16_data.xlsx --speed 100 --port 8080
+    #      python Esp32Emulator.py 2024-04-16_data.xlsx --pty --restamp
+    parser = argparse.ArgumentParser(description="Replay a logged day as if it came from the ESP32")
+    parser.add_argument("day")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 for as fast as possible")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +- seconds on each row")
+    parser.add_argument("--truncate", type=float, default=0.0, help="fraction of rows cut short")
+    parser.add_argument("--disconnect", type=float, default=0.0, help="fraction of rows followed by a dropped link")
+    parser.add_argument("--binary", action="store_true", help="send telemetry_frame.h frames")
+    parser.add_argument("--restamp", action="store_true", help="stamp rows with the current time")
+    parser.add_argument("--pty", action="store_true", help="serve on a pseudo-terminal instead of TCP")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--mode", choices=["stream", "connection"], default="stream")
+    args = parser.parse_args()
+
+    replay = Replay.from_file(args.day, speed=args.speed or None, jitter=args.jitter, truncate=args.truncate,
+                              disconnect=args.disconnect, binary=args.binary, restamp=args.restamp)
+    if args.pty:
+        emulator = PtyEmulator(replay).start()
+        print(f"Replaying {len(replay)} rows on {emulator.port}, set COM_PORT to it")
+    else:
+        emulator = TcpEmulator(replay, "0.0.0.0", args.port, args.mode).start()
+        print(f"Replaying {len(replay)} rows on port {emulator.port}, set ESP32_RESOLVERS = [\"static\"], ESP32_STATIC_IP = \"127.0.0.1\" and ESP32_PORT = {emulator.port}")
+    try:
+        emulator.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.close()
+        print(replay.stats())
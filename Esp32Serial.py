@@ -0,0 +1,104 @@
+import time
+from collections import deque
+from datetime import datetime
+import details
+import LoggerMetrics
+from LoggingPipeline import parse_record, RecordError
+
+# Buffered reader for the Bluetooth serial link. Whatever bytes are waiting are read in one
+# call and split into newline terminated records, and the time is only sent to the board
+# every TIME_SYNC_INTERVAL seconds or when the logged time drifts from the host clock.
+
+class Esp32SerialReader:
+    def __init__(self, ser, sync_interval=None, max_skew=None, max_line=4096, metrics=None):
+        self.ser = ser
+        self.sync_interval = details.TIME_SYNC_INTERVAL if sync_interval is None else sync_interval
+        self.max_skew = details.TIME_SYNC_MAX_SKEW if max_skew is None else max_skew
+        self.max_line = max_line
+        self.buffer = bytearray()
+        self.lines = deque()
+        self.last_sync = None
+        self.started = time.monotonic()
+        self.rows = 0
+        self.bytes = 0
+        self.framing_errors = 0
+        self.syncs = 0
+        self.last_skew = None
+        self.max_abs_skew = 0.0
+        self.metrics = LoggerMetrics.metrics if metrics is None else metrics
+
+    def send_time(self):
+        current_time = time.strftime("%Y-%m-%d %H:%M:%S")
+        timeMessage = current_time+"\n"
+        self.ser.write(timeMessage.encode())
+        self.last_sync = time.monotonic()
+        self.syncs += 1
+
+    def fill(self):
+        # Blocks for at most the port timeout waiting for the first byte
+        with self.metrics.time("serial_read"):
+            data = self.ser.read(self.ser.in_waiting or 1)
+        if not data:
+            return False
+        self.bytes += len(data)
+        self.buffer += data
+        *lines, rest = self.buffer.split(b'\n')
+        self.lines.extend(lines)
+        self.buffer = bytearray(rest)
+        if len(self.buffer) > self.max_line:
+            self.framing_errors += 1
+            self.buffer.clear()
+        return True
+
+    def check_skew(self, timeLog, calc):
+        # Rows from a tracking run are stamped before the 18 s search, and rows just after a
+        # sync may have been sampled before it arrived, so neither says anything about drift
+        if calc or (time.monotonic() - self.last_sync) < 5:
+            return
+        now = datetime.now()
+        hour, minute, second = (int(part) for part in timeLog.split(':'))
+        skew = (hour * 3600 + minute * 60 + second) - (now.hour * 3600 + now.minute * 60 + now.second)
+        skew = (skew + 43200) % 86400 - 43200
+        self.last_skew = skew
+        self.max_abs_skew = max(self.max_abs_skew, abs(skew))
+        if abs(skew) > self.max_skew:
+            self.last_sync = None
+
+    def read(self):
+        if self.last_sync is None or (time.monotonic() - self.last_sync) >= self.sync_interval:
+            self.send_time()
+        while True:
+            while not self.lines:
+                if not self.fill():
+                    return None
+            line = self.lines.popleft().decode('utf-8', errors='replace').strip()
+            if not line:
+                continue
+            try:
+                record = parse_record(line)
+            except RecordError:
+                # Counted, and left to the pipeline to quarantine with the line it came from
+                self.framing_errors += 1
+                raise
+            try:
+                self.check_skew(record[0], record[1])
+            except (ValueError, IndexError):
+                # Time Logged is not HH:MM:SS, the pipeline's validator rejects the record
+                pass
+            self.rows += 1
+            return record
+
+    def close(self):
+        self.ser.close()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "rows": self.rows,
+            "rows/s": round(self.rows / elapsed, 2) if elapsed > 0 else 0.0,
+            "bytes": self.bytes,
+            "framing_errors": self.framing_errors,
+            "time_syncs": self.syncs,
+            "last_skew(s)": self.last_skew,
+            "max_skew(s)": self.max_abs_skew,
+        }
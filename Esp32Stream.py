@@ -0,0 +1,152 @@
+import time
+import socket
+from collections import deque
+from datetime import datetime
+import details
+import LoggerMetrics
+from LoggingPipeline import parse_record
+from TelemetryFrame import decode_frames, frames_to_records
+
+# Long lived connection to the ESP32. The sketch keeps the client open and println()s one
+# record per sample, so records are framed on newline from a buffered stream instead of
+# one recv() per fresh connection. With binary=True the sketch sends telemetry_frame.h
+# frames instead and every complete frame in the buffer is decoded in one go.
+# WiFiSource is the older way, one connection per record, for a sketch with WIFI_STREAM off.
+
+class Esp32StreamClient:
+    def __init__(self, address, port=80, read_timeout=None, max_backoff=None, binary=None, metrics=None):
+        self.address = address
+        self.port = port
+        self.binary = details.TELEMETRY_BINARY if binary is None else binary
+        self.pending = deque()
+        self.skipped_bytes = 0
+        self.read_timeout = details.STREAM_READ_TIMEOUT if read_timeout is None else read_timeout
+        self.max_backoff = details.STREAM_MAX_BACKOFF if max_backoff is None else max_backoff
+        self.sock = None
+        self.buffer = bytearray()
+        self.backoff = 1
+        self.connects = 0
+        self.disconnects = 0
+        self.metrics = LoggerMetrics.metrics if metrics is None else metrics
+
+    def connect(self):
+        ip = self.address.get()
+        try:
+            with self.metrics.time("connect"):
+                self.sock = socket.create_connection((ip, self.port), timeout=3)
+        except (OSError, TypeError) as e:
+            print(datetime.now().strftime('%H:%M:%S')+" "+f"Could not connect to ESP32 at {ip}, retrying in {self.backoff}s: {e}")
+            self.address.invalidate()
+            time.sleep(self.backoff)
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            return False
+        self.sock.settimeout(self.read_timeout)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self.buffer.clear()
+        self.connects += 1
+        return True
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            self.disconnects += 1
+
+    def read_line(self):
+        while True:
+            end = self.buffer.find(b'\n')
+            if end >= 0:
+                line = bytes(self.buffer[:end])
+                del self.buffer[:end + 1]
+                return line.decode('utf-8').strip()
+            with self.metrics.time("recv"):
+                data = self.sock.recv(4096)
+            if not data:
+                raise ConnectionError("ESP32 closed the connection")
+            self.buffer += data
+
+    def read_frames(self):
+        while True:
+            frames, consumed, skipped = decode_frames(self.buffer)
+            records = frames_to_records(frames)
+            # frames is a view into the buffer, release it before the buffer is resized
+            del frames
+            del self.buffer[:consumed]
+            self.skipped_bytes += skipped
+            if records:
+                return records
+            with self.metrics.time("recv"):
+                data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("ESP32 closed the connection")
+            self.buffer += data
+
+    def read(self):
+        if self.pending:
+            return self.pending.popleft()
+        if self.sock is None and not self.connect():
+            return None
+        if self.binary:
+            try:
+                self.pending.extend(self.read_frames())
+            except OSError as e:
+                print(datetime.now().strftime('%H:%M:%S')+" "+f"Lost connection to ESP32: {e}")
+                self.metrics.count("lost_connections")
+                self.close()
+                return None
+            self.backoff = 1
+            return self.pending.popleft()
+        try:
+            line = self.read_line()
+        except OSError as e:
+            # Covers timeouts too, the board sends at least once per trackingCall
+            print(datetime.now().strftime('%H:%M:%S')+" "+f"Lost connection to ESP32: {e}")
+            self.metrics.count("lost_connections")
+            self.close()
+            return None
+        self.backoff = 1
+        if not line:
+            return None
+        return parse_record(line)
+
+    def stats(self):
+        return {"connects": self.connects, "disconnects": self.disconnects, "skipped_bytes": self.skipped_bytes, "pending": len(self.pending)}
+
+def read_esp32(ip, port, metrics=None):
+    metrics = LoggerMetrics.metrics if metrics is None else metrics
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
+        client_socket.settimeout(3)
+        with metrics.time("connect"):
+            client_socket.connect((ip, port))
+        client_socket.settimeout(details.STREAM_READ_TIMEOUT)
+
+        # Read up to the end of the record rather than whatever the first recv returns
+        data = b''
+        while b'\n' not in data:
+            with metrics.time("recv"):
+                chunk = client_socket.recv(1024)
+            if not chunk:
+                break
+            data += chunk
+
+    decodedData = data.split(b'\n')[0].decode('utf-8')
+    return parse_record(decodedData)
+
+class WiFiSource:
+    # One connection per record, for sketches run with WIFI_STREAM off
+    def __init__(self, address, port=None, metrics=None):
+        self.address = address
+        self.port = details.ESP32_PORT if port is None else port
+        self.metrics = LoggerMetrics.metrics if metrics is None else metrics
+
+    def read(self):
+        esp32_ip = self.address.get()
+        # No checkEsp32Connection probe first: the sketch hands its next row to the first client
+        # it accepts, and the probe closes straight away, so that row would be lost
+        try:
+            return read_esp32(esp32_ip, self.port, self.metrics)
+        except (OSError, TypeError) as e:
+            print(datetime.now().strftime('%H:%M:%S')+" "+f"Could not read from ESP32 at {esp32_ip}: {e}")
+            # The board may have rejoined the network with a new address
+            self.address.invalidate()
+            return None
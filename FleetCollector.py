@@ -0,0 +1,185 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+import details
+import LoggerMetrics
+from LoggerMetrics import Metrics, start_exporters, stop_exporters
+from DataLogSink import LogSink
+from EnergyAccounting import EnergyAccumulator
+from LiveBuffer import LiveBuffer, start_live_server
+from DataValidation import RecordValidator
+from WeatherProvider import WeatherProvider, url_base
+from Esp32Discovery import CachedEsp32Address, GitHubResolver, StaticResolver, FileResolver, MdnsResolver
+from Esp32Stream import Esp32StreamClient, WiFiSource
+from Esp32Serial import Esp32SerialReader
+from LoggingPipeline import LoggingPipeline
+from LoggerSupervisor import Supervisor
+
+# Logs any number of boards from one process. Each entry in FLEET_DEVICES is a dict:
+#   {"name": "roof-east", "type": "wifi", "ip": "192.168.1.40", "port": 80}
+#   {"name": "roof-west", "type": "wifi", "resolvers": ["github"], "github_file": "west_ip.txt"}
+#   {"name": "bench", "type": "serial", "port": "COM9"}
+# with optional "stream", "binary", "baud", "location" (for its own weather) and "base_path".
+# Every device gets its own pipeline with its own bounded queues and reader/writer threads,
+# so a device that blocks, floods or drops out only fills and drops from its own queues.
+# Its source and sink are supervised components that are reopened on their own, and a
+# pipeline that dies is rebuilt without touching the others. Rows go to a LogSink in
+# BASE_PATH/<name>/ tagged with a Device column, next to that device's energy totals, and
+# its recent rows are served from memory at /<name>/latest etc. (LiveBuffer). Records that
+# fail the DataValidation checks go to that device's own quarantine file.
+
+# Per-device settings that point a resolver somewhere other than the details file
+RESOLVER_OPTIONS = {
+    "github": (GitHubResolver, "github_file", "file_path"),
+    "static": (StaticResolver, "ip", "ip"),
+    "file": (FileResolver, "ip_file", "path"),
+    "mdns": (MdnsResolver, "mdns_host", "hostname"),
+}
+
+def device_resolvers(config):
+    # A device with just an "ip" needs no other lookup
+    names = config.get("resolvers", ["static"] if "ip" in config else details.ESP32_RESOLVERS)
+    resolvers = []
+    for name in names:
+        resolver, key, argument = RESOLVER_OPTIONS[name]
+        resolvers.append(resolver(**({argument: config[key]} if key in config else {})))
+    return resolvers
+
+class DeviceLogSink(LogSink):
+    # Tags every row with the device it came from, so partitions can be merged later on
+    def __init__(self, device, **options):
+        super().__init__(**options)
+        self.device = device
+
+    def append(self, data):
+        if isinstance(data, dict):
+            data = {**data, "Device": self.device}
+        super().append(data)
+
+class Device:
+    def __init__(self, config, weather, base_path=None):
+        self.name = config["name"]
+        self.kind = config.get("type", "wifi")
+        if self.kind not in ("wifi", "serial"):
+            raise ValueError(f"Device {self.name} has unknown type {self.kind}")
+        self.config = config
+        self.base_path = config.get("base_path") or os.path.join(details.BASE_PATH if base_path is None else base_path, self.name)
+        os.makedirs(self.base_path, exist_ok=True)
+        self.weather = weather
+        self.metrics = Metrics()
+        self.supervisor = Supervisor()
+        self.source = self.supervisor.source("source", self.open_source)
+        self.sink = self.supervisor.sink("sink", lambda: DeviceLogSink(self.name, base_path=self.base_path, metrics=self.metrics))
+        self.energy = EnergyAccumulator(base_path=self.base_path)
+        self.live = LiveBuffer()
+        self.validator = RecordValidator(base_path=self.base_path)
+        self.pipeline = None
+
+    def open_source(self):
+        if self.kind == "serial":
+            # Only needed for serial devices, a WiFi-only fleet runs without pyserial
+            import serial
+            ser = serial.Serial(self.config["port"], self.config.get("baud", 115200), timeout=1)
+            print(f"{self.name}: connected to {self.config['port']}")
+            return Esp32SerialReader(ser, metrics=self.metrics)
+        address = CachedEsp32Address(device_resolvers(self.config), metrics=self.metrics)
+        port = self.config.get("port", details.ESP32_PORT)
+        if self.config.get("stream", details.WIFI_STREAM):
+            return Esp32StreamClient(address, port, binary=self.config.get("binary"), metrics=self.metrics)
+        return WiFiSource(address, port, metrics=self.metrics)
+
+    def make_pipeline(self):
+        self.pipeline = LoggingPipeline(self.source, self.sink, self.weather, metrics=self.metrics, energy=self.energy, live=self.live, validator=self.validator)
+        return self.pipeline
+
+    def status(self):
+        snapshot = self.metrics.snapshot()
+        since = snapshot["since_last_sample(s)"]
+        return {
+            "type": self.kind,
+            "healthy": since is not None and since <= details.FLEET_STALE_SECONDS,
+            "components": self.supervisor.stats(),
+            **snapshot,
+        }
+
+    def close(self):
+        self.sink.close()
+        self.energy.close()
+        source = self.source.component.instance
+        if source is not None and hasattr(source, "close"):
+            source.close()
+
+class FleetCollector:
+    def __init__(self, devices=None, base_path=None, max_backoff=None):
+        configs = details.FLEET_DEVICES if devices is None else devices
+        names = [config["name"] for config in configs]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Device names must be unique: {names}")
+        self.max_backoff = details.SUPERVISOR_MAX_BACKOFF if max_backoff is None else max_backoff
+        # Devices at the same location share one weather feed
+        self.weather = {}
+        self.devices = []
+        for config in configs:
+            location = config.get("location", details.LOCATION)
+            if location not in self.weather:
+                self.weather[location] = WeatherProvider(url=url_base + "appid=" + details.API_KEY + "&q=" + location)
+            self.devices.append(Device(config, self.weather[location], base_path))
+        # The shared registry (weather timings) carries every device's own numbers
+        self.metrics = LoggerMetrics.metrics
+        for device in self.devices:
+            self.metrics.attach(device.name, device.status)
+
+    async def run_device(self, device):
+        backoff = min(1, self.max_backoff)
+        while True:
+            pipeline = device.make_pipeline()
+            started = time.monotonic()
+            try:
+                await pipeline.run()
+            except Exception as e:
+                device.supervisor.pipeline_restarts += 1
+                print(datetime.now().strftime('%H:%M:%S')+" "+f"{device.name}: pipeline stopped, restarting in {backoff}s: {e}")
+            finally:
+                # Waiting for its writer thread must not hold up the other devices
+                await asyncio.to_thread(pipeline.shutdown)
+            if time.monotonic() - started > 60:
+                backoff = min(1, self.max_backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def run(self):
+        await asyncio.gather(*(self.run_device(device) for device in self.devices))
+
+    def start_weather(self):
+        for provider in self.weather.values():
+            provider.start()
+
+    def close(self):
+        for provider in self.weather.values():
+            provider.stop()
+        for device in self.devices:
+            device.close()
+
+    def stats(self):
+        return {device.name: {key: value for key, value in device.status().items() if key != "stages"} for device in self.devices}
+
+if __name__ == "__main__":
+    if not details.FLEET_DEVICES:
+        print("Add the boards to FLEET_DEVICES in the details file")
+        exit()
+    fleet = FleetCollector()
+    fleet.start_weather()
+    exporters = start_exporters(fleet.metrics)
+    live_server = start_live_server({device.name: device.live for device in fleet.devices})
+    try:
+        asyncio.run(fleet.run())
+    except KeyboardInterrupt:
+        print("\nFleet logging terminated.")
+    finally:
+        fleet.close()
+        stop_exporters(exporters)
+        if live_server is not None:
+            live_server.stop()
+        for name, stats in fleet.stats().items():
+            print(name, stats)
@@ -1,8 +1,9 @@
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
-from datetime import datetime
 import matplotlib.dates as mdates
-import os
+from DatasetCache import load_day
+from RollupEngine import load_rollups, rollup_means, select
+from Downsample import lttb
 
 # Directory containing Excel files
 directory = r' '
@@ -10,20 +11,25 @@ directory = r' '
 # List of specific filenames you want to process
 specific_filenames = ['2024-04-16_data.xlsx']
 
-def DataAveraged(directory,filename):
-    filepath = os.path.join(directory, filename)
-    df = pd.read_excel(filepath)
-    datetime_objects = pd.to_datetime(df['Time Logged'], format="%H:%M:%S")
-    df['Timestamp'] = datetime_objects
-    df['MinuteTimestamp'] = df['Timestamp'].dt.round('min')
-    df['HourlyTimestamp'] = df['Timestamp'].dt.round('h')
-    df['15MinTimestamp'] = df['Timestamp'].dt.round('15min')
-    df['30MinTimestamp'] = df['Timestamp'].dt.round('30min')
-    plt.plot(df['Timestamp'], df['SPA Panel Power(W)'], label='Raw Data')
-    minute_averaged_data = df.groupby('MinuteTimestamp')['SPA Panel Power(W)'].mean()
-    hourly_averaged_data = df.groupby('HourlyTimestamp')['SPA Panel Power(W)'].mean()
-    fifteen_min_averaged_data = df.groupby('15MinTimestamp')['SPA Panel Power(W)'].mean()
-    thirty_min_averaged_data = df.groupby('30MinTimestamp')['SPA Panel Power(W)'].mean()
+# Raw series are thinned to this many points with LTTB before plotting, None plots every sample
+max_points_default = 5000
+
+def show(save_path=None):
+    # Charts go to a window, or to save_path (any format savefig knows) when rendering in batch
+    if save_path is None:
+        plt.show()
+    else:
+        plt.savefig(save_path, dpi=100, bbox_inches='tight')
+        plt.close('all')
+
+def DataAveraged(directory, filename, save_path=None, max_points=max_points_default):
+    df = load_day(directory, filename)
+    rollups = rollup_means(directory, filename)
+    plt.plot(*lttb(df['Timestamp'], df['SPA Panel Power(W)'], max_points), label='Raw Data')
+    minute_averaged_data = rollups['1min']['SPA Panel Power(W)']
+    hourly_averaged_data = rollups['1h']['SPA Panel Power(W)']
+    fifteen_min_averaged_data = rollups['15min']['SPA Panel Power(W)']
+    thirty_min_averaged_data = rollups['30min']['SPA Panel Power(W)']
     plt.plot(minute_averaged_data.index, minute_averaged_data.values, label='Minute Averaged Data')
     plt.plot(fifteen_min_averaged_data.index, fifteen_min_averaged_data.values, label='15-Min Averaged Data')
     plt.plot(thirty_min_averaged_data.index, thirty_min_averaged_data.values, label='30-Min Averaged Data')
@@ -35,21 +41,17 @@ def DataAveraged(directory,filename):
     plt.grid(True)
     plt.xticks(rotation=45)
     plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-    plt.show()
+    show(save_path)
 
-def PowerVsAngle(directory,filename):
-    filepath = os.path.join(directory, filename)
-    df = pd.read_excel(filepath)
-    datetime_objects = pd.to_datetime(df['Time Logged'], format="%H:%M:%S")
-    df['Timestamp'] = datetime_objects
-    df['MinuteTimestamp'] = df['Timestamp'].dt.round('15min')
-    minute_averaged_data_spa = df.groupby('MinuteTimestamp')['SPA Panel Power(W)'].mean()
-    minute_averaged_data_fix = df.groupby('MinuteTimestamp')['Fixed Panel Power(W)'].mean()
-    minute_averaged_data_tra = df.groupby('MinuteTimestamp')['Tracking Panel Power(W)'].mean()
-    minute_averaged_data_spr = df.groupby('MinuteTimestamp')['Spa Panel Rotate'].mean()
-    minute_averaged_data_tpr = df.groupby('MinuteTimestamp')['Tracking Panel Rotate'].mean()
-    minute_averaged_data_spt = df.groupby('MinuteTimestamp')['Spa Panel Tilt'].mean()
-    minute_averaged_data_tpt = df.groupby('MinuteTimestamp')['Tracking Panel Tilt'].mean()
+def PowerVsAngle(directory, filename, save_path=None, max_points=max_points_default):
+    averaged = rollup_means(directory, filename)['15min']
+    minute_averaged_data_spa = averaged['SPA Panel Power(W)']
+    minute_averaged_data_fix = averaged['Fixed Panel Power(W)']
+    minute_averaged_data_tra = averaged['Tracking Panel Power(W)']
+    minute_averaged_data_spr = averaged['Spa Panel Rotate']
+    minute_averaged_data_tpr = averaged['Tracking Panel Rotate']
+    minute_averaged_data_spt = averaged['Spa Panel Tilt']
+    minute_averaged_data_tpt = averaged['Tracking Panel Tilt']
     fig, ax1 = plt.subplots(figsize=(10, 6))
     ax1.plot(minute_averaged_data_fix.index, minute_averaged_data_fix.values, color='m', label='Fixed Panel Power')
     ax1.plot(minute_averaged_data_spa.index, minute_averaged_data_spa.values, color='orange', label='SPA Panel Power')
@@ -73,27 +75,30 @@ def PowerVsAngle(directory,filename):
     plt.grid(True)
     plt.xticks(rotation=45)
     plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-    plt.show()
+    show(save_path)
 
-def PowVsCloud(directory,filename):
-    filepath = os.path.join(directory, filename)
-    df = pd.read_excel(filepath)
+def PowVsCloud(directory, filename, save_path=None, max_points=max_points_default):
+    df = load_day(directory, filename)
     fixPower = df['Fixed Panel Power(W)']
     spaPower = df['SPA Panel Power(W)']
     traPower = df['Tracking Panel Power(W)']
     cloPer = df['Cloud Coverage']
-    timestamps = df['Time Logged']
-    datetime_objects = [datetime.strptime(ts, "%H:%M:%S") for ts in timestamps]
+    datetime_objects = df['Timestamp']
     fig, ax1 = plt.subplots(figsize=(10, 6))
-    ax1.plot(datetime_objects, fixPower, color='k', label="Fixed")
-    ax1.plot(datetime_objects, spaPower, color='m', label="SPA")
-    ax1.plot(datetime_objects, traPower, color='g', label="Tracking")
+    ax1.plot(*lttb(datetime_objects, fixPower, max_points), color='k', label="Fixed")
+    ax1.plot(*lttb(datetime_objects, spaPower, max_points), color='m', label="SPA")
+    ax1.plot(*lttb(datetime_objects, traPower, max_points), color='g', label="Tracking")
     ax1.set_xlabel('Time (Hours)')
     ax1.set_ylabel('Power (Watts)')
     ax1.tick_params(axis='y')
     ax2 = ax1.twinx()
-    ax2.bar(datetime_objects, cloPer, color='skyblue', width=0.0004, label = "Cloud Coverage")
-    ax2.plot(datetime_objects, cloPer)
+    # Each bar is a separate patch, so they are capped at about one per pixel column of the figure
+    # and stretched to meet the next one kept
+    cloud_times, cloPer = lttb(datetime_objects, cloPer, max_points and min(max_points, 1000))
+    cloud_days = mdates.date2num(cloud_times)
+    widths = np.maximum(np.diff(cloud_days, append=cloud_days[-1] + 0.0004), 0.0004)
+    ax2.bar(cloud_times, cloPer, color='skyblue', width=widths, align='edge', label = "Cloud Coverage")
+    ax2.plot(cloud_times, cloPer)
     ax2.set_ylabel('Cloud Coverage (Percentage)')
     ax2.tick_params(axis='y')
     ax2.set_zorder(1)
@@ -104,18 +109,14 @@ def PowVsCloud(directory,filename):
     ax2.legend(loc='upper left')
     plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
     plt.tight_layout()
-    plt.show()
+    show(save_path)
 
-def MinutePowVsCloud(directory,filename):
-    filepath = os.path.join(directory, filename)
-    df = pd.read_excel(filepath)
-    datetime_objects = pd.to_datetime(df['Time Logged'], format="%H:%M:%S")
-    df['Timestamp'] = datetime_objects
-    df['MinuteTimestamp'] = df['Timestamp'].dt.round('min')
-    minute_averaged_data_spa = df.groupby('MinuteTimestamp')['SPA Panel Power(W)'].mean()
-    minute_averaged_data_fix = df.groupby('MinuteTimestamp')['Fixed Panel Power(W)'].mean()
-    minute_averaged_data_tra = df.groupby('MinuteTimestamp')['Tracking Panel Power(W)'].mean()
-    minute_averaged_data_clo = df.groupby('MinuteTimestamp')['Cloud Coverage'].mean()
+def MinutePowVsCloud(directory, filename, save_path=None, max_points=max_points_default):
+    averaged = rollup_means(directory, filename)['1min']
+    minute_averaged_data_spa = averaged['SPA Panel Power(W)']
+    minute_averaged_data_fix = averaged['Fixed Panel Power(W)']
+    minute_averaged_data_tra = averaged['Tracking Panel Power(W)']
+    minute_averaged_data_clo = averaged['Cloud Coverage']
     fig, ax1 = plt.subplots(figsize=(10, 6))
     ax1.plot(minute_averaged_data_fix.index, minute_averaged_data_fix.values, color='m', label='Fixed Panel Power')
     ax1.plot(minute_averaged_data_spa.index, minute_averaged_data_spa.values, color='orange', label='SPA Panel Power')
@@ -138,18 +139,14 @@ def MinutePowVsCloud(directory,filename):
     plt.grid(True)
     plt.xticks(rotation=45)
     plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-    plt.show()
+    show(save_path)
 
-def FifteenMinutePowVsCloud(directory,filename):
-    filepath = os.path.join(directory, filename)
-    df = pd.read_excel(filepath)
-    datetime_objects = pd.to_datetime(df['Time Logged'], format="%H:%M:%S")
-    df['Timestamp'] = datetime_objects
-    df['MinuteTimestamp'] = df['Timestamp'].dt.round('15min')
-    minute_averaged_data_spa = df.groupby('MinuteTimestamp')['SPA Panel Power(W)'].mean()
-    minute_averaged_data_fix = df.groupby('MinuteTimestamp')['Fixed Panel Power(W)'].mean()
-    minute_averaged_data_tra = df.groupby('MinuteTimestamp')['Tracking Panel Power(W)'].mean()
-    minute_averaged_data_clo = df.groupby('MinuteTimestamp')['Cloud Coverage'].mean()
+def FifteenMinutePowVsCloud(directory, filename, save_path=None, max_points=max_points_default):
+    averaged = rollup_means(directory, filename)['15min']
+    minute_averaged_data_spa = averaged['SPA Panel Power(W)']
+    minute_averaged_data_fix = averaged['Fixed Panel Power(W)']
+    minute_averaged_data_tra = averaged['Tracking Panel Power(W)']
+    minute_averaged_data_clo = averaged['Cloud Coverage']
     fig, ax1 = plt.subplots(figsize=(10, 6))
     ax1.plot(minute_averaged_data_fix.index, minute_averaged_data_fix.values, color='m', label='Fixed Panel Power')
     ax1.plot(minute_averaged_data_spa.index, minute_averaged_data_spa.values, color='orange', label='SPA Panel Power')
@@ -172,19 +169,14 @@ def FifteenMinutePowVsCloud(directory,filename):
     plt.grid(True)
     plt.xticks(rotation=45)
     plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-    plt.show()
+    show(save_path)
 
-def FifteenMinutePowVsSunElevationAngle(directory, filename):
-    filepath = os.path.join(directory, filename)
-    df = pd.read_excel(filepath)
-    datetime_objects = pd.to_datetime(df['Time Logged'], format="%H:%M:%S")
-    df['Timestamp'] = datetime_objects
-    df['MinuteTimestamp'] = df['Timestamp'].dt.round('15min')
-    df['ZenTimestamp'] = df['Timestamp'].dt.round('min')
-    minute_averaged_data_spa = df.groupby('MinuteTimestamp')['SPA Panel Power(W)'].mean()
-    minute_averaged_data_fix = df.groupby('MinuteTimestamp')['Fixed Panel Power(W)'].mean()
-    minute_averaged_data_tra = df.groupby('MinuteTimestamp')['Tracking Panel Power(W)'].mean()
-    minute_averaged_data_zen = df.groupby('MinuteTimestamp')['SPA Zenith'].mean()
+def FifteenMinutePowVsSunElevationAngle(directory, filename, save_path=None, max_points=max_points_default):
+    averaged = rollup_means(directory, filename)['15min']
+    minute_averaged_data_spa = averaged['SPA Panel Power(W)']
+    minute_averaged_data_fix = averaged['Fixed Panel Power(W)']
+    minute_averaged_data_tra = averaged['Tracking Panel Power(W)']
+    minute_averaged_data_zen = averaged['SPA Zenith']
     fig, ax1 = plt.subplots(figsize=(10, 6))
     ax1.plot(minute_averaged_data_fix.index, minute_averaged_data_fix.values, color='m', label='Fixed Panel Power')
     ax1.plot(minute_averaged_data_spa.index, minute_averaged_data_spa.values, color='orange', label='SPA Panel Power')
@@ -208,35 +200,40 @@ def FifteenMinutePowVsSunElevationAngle(directory, filename):
     plt.grid(True)
     plt.xticks(rotation=45)
     plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-    plt.show()
+    show(save_path)
 
-def TotalPower(directory, filename):
-    filepath = os.path.join(directory, filename)
-    df = pd.read_excel(filepath)
-    datetime_objects = pd.to_datetime(df['Time Logged'], format="%H:%M:%S")
-    df['Timestamp'] = datetime_objects
-    df['HourlyTimestamp'] = df['Timestamp'].dt.round('15min')
-    hour_averaged_data_spa = df.groupby('HourlyTimestamp')['SPA Panel Power(W)'].mean()
-    hour_averaged_data_fix = df.groupby('HourlyTimestamp')['Fixed Panel Power(W)'].mean()
-    hour_averaged_data_tra = df.groupby('HourlyTimestamp')['Tracking Panel Power(W)'].mean()
+def TotalPower(directory, filename, save_path=None, max_points=max_points_default):
+    rollups = load_rollups(directory, filename)['15min']
+    hour_averaged_data = select(rollups, 'mean')
+    hour_averaged_data_spa = hour_averaged_data['SPA Panel Power(W)']
+    hour_averaged_data_fix = hour_averaged_data['Fixed Panel Power(W)']
+    hour_averaged_data_tra = hour_averaged_data['Tracking Panel Power(W)']
     SpaTotPower = (hour_averaged_data_spa.values).sum()
     FixTotPower = (hour_averaged_data_fix.values).sum()
     TraTotPower = (hour_averaged_data_tra.values).sum()
     hours = len(hour_averaged_data_spa.index)
-    first_timestamp = df['Timestamp'].iloc[0]
-    last_timestamp = df['Timestamp'].iloc[-1]
-    totalTime = (last_timestamp - first_timestamp).total_seconds()
+    first_timestamp = select(rollups, 'min')['Timestamp'].min()
+    last_timestamp = select(rollups, 'max')['Timestamp'].max()
+    totalTime = last_timestamp - first_timestamp
     algRuns = totalTime//300
-    print("How many 15 minute windows = "+str(hours))
-    print("How many seconds = "+str(totalTime))
-    print("How many times did the algorithm run = "+str(algRuns))
-    print("Solar Position Algorithm panel total power when averaged per 15 minutes= "+str(SpaTotPower))
-    print("Fixed panel total power when averaged per 15 minutes = "+str(FixTotPower))
-    print("Tracking total power when averaged per 15 minutes = "+str(TraTotPower))
-    print("Solar Position Algorithm panel average power = "+str((SpaTotPower/hours)-(algRuns*0.000094)*2))
-    print("Fixed panel average power = "+str((FixTotPower/hours)))
-    print("Tracking average power = "+str((TraTotPower/hours)-(algRuns*0.000094)*2))
-    
+    lines = [
+        "How many 15 minute windows = "+str(hours),
+        "How many seconds = "+str(totalTime),
+        "How many times did the algorithm run = "+str(algRuns),
+        "Solar Position Algorithm panel total power when averaged per 15 minutes= "+str(SpaTotPower),
+        "Fixed panel total power when averaged per 15 minutes = "+str(FixTotPower),
+        "Tracking total power when averaged per 15 minutes = "+str(TraTotPower),
+        "Solar Position Algorithm panel average power = "+str((SpaTotPower/hours)-(algRuns*0.000094)*2),
+        "Fixed panel average power = "+str((FixTotPower/hours)),
+        "Tracking average power = "+str((TraTotPower/hours)-(algRuns*0.000094)*2),
+    ]
+    # There is no chart, so a batch run saves the same lines as text
+    if save_path is None:
+        print("\n".join(lines))
+    else:
+        with open(save_path, "w") as report:
+            report.write("\n".join(lines) + "\n")
+
 
 def list_functions():
     print("Functions:")
@@ -0,0 +1,248 @@
+import json
+import threading
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import details
+from LoggingPipeline import RECORD_COLUMNS
+from EnergyAccounting import PANELS, sample_time
+
+# The last LIVE_HOURS of rows kept in memory by the logger, so what the panels are doing now
+# can be read without opening the file it is writing. Rows go into a fixed numpy ring and
+# every row also updates 1 and 15 minute bins (sum/count/min/max per column), held in their
+# own rings and addressed directly by bin number, so the aggregates never rescan rows.
+# Bins are centred like RollupEngine's, to line up with the charts. A small JSON endpoint
+# on LIVE_HOST:LIVE_PORT answers from memory:
+#   /latest                                  the newest row
+#   /window?minutes=30&resolution=1min       raw rows or bins for the last minutes
+#   /compare?minutes=60                      fixed vs SPA vs tracking over the last minutes
+# optionally with &columns=SPA Panel Power(W),Cloud Coverage
+
+LIVE_COLUMNS = RECORD_COLUMNS[1:] + ["Temperature", "Cloud Coverage", "Pressure", "Humidity", "Weather Age(s)"]
+RESOLUTIONS = {"1min": 60, "15min": 900}
+POWER_COLUMNS = list(PANELS.values())
+
+def to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def json_values(values):
+    # JSON has no NaN, missing values go out as null
+    return [None if value != value else round(float(value), 6) for value in values]
+
+def isotime(seconds):
+    return datetime.fromtimestamp(seconds).isoformat(timespec="seconds")
+
+class BinRing:
+    def __init__(self, width, hours, columns):
+        self.width = width
+        self.size = int(hours * 3600 // width) + 2
+        self.keys = np.full(self.size, -1, dtype=np.int64)
+        self.sums = np.zeros((self.size, columns))
+        self.counts = np.zeros((self.size, columns), dtype=np.int64)
+        self.mins = np.full((self.size, columns), np.inf)
+        self.maxs = np.full((self.size, columns), -np.inf)
+
+    def add(self, seconds, values, present):
+        key = int(np.round(seconds / self.width))
+        slot = key % self.size
+        if self.keys[slot] != key:
+            if self.keys[slot] > key:
+                # Older than anything this ring still holds
+                return
+            self.keys[slot] = key
+            self.sums[slot] = 0
+            self.counts[slot] = 0
+            self.mins[slot] = np.inf
+            self.maxs[slot] = -np.inf
+        self.sums[slot] += np.where(present, values, 0)
+        self.counts[slot] += present
+        np.fmin(self.mins[slot], values, out=self.mins[slot])
+        np.fmax(self.maxs[slot], values, out=self.maxs[slot])
+
+    def since(self, seconds):
+        # Slots for bins from seconds onwards, oldest first
+        slots = np.flatnonzero(self.keys * self.width >= seconds - self.width / 2)
+        return slots[np.argsort(self.keys[slots])]
+
+class LiveBuffer:
+    def __init__(self, hours=None, capacity=None):
+        self.hours = details.LIVE_HOURS if hours is None else hours
+        self.capacity = details.LIVE_BUFFER_ROWS if capacity is None else capacity
+        self.columns = LIVE_COLUMNS
+        self.positions = {column: i for i, column in enumerate(self.columns)}
+        self.times = np.full(self.capacity, np.nan)
+        self.values = np.full((self.capacity, len(self.columns)), np.nan)
+        self.weather = None
+        self.head = 0
+        self.count = 0
+        self.newest = -np.inf
+        self.bins = {resolution: BinRing(width, self.hours, len(self.columns)) for resolution, width in RESOLUTIONS.items()}
+        self.lock = threading.Lock()
+
+    def add(self, row):
+        # Same dict the pipeline hands to the sink
+        try:
+            seconds = sample_time(row).timestamp()
+        except (KeyError, ValueError, TypeError):
+            return
+        values = np.array([to_number(row.get(column)) for column in self.columns])
+        present = ~np.isnan(values)
+        with self.lock:
+            self.times[self.head] = seconds
+            self.values[self.head] = values
+            self.head = (self.head + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+            self.newest = max(self.newest, seconds)
+            self.weather = (row.get("Weather"), row.get("Description"))
+            for ring in self.bins.values():
+                ring.add(seconds, values, present)
+
+    def column_positions(self, columns):
+        if columns is None:
+            return list(range(len(self.columns)))
+        unknown = [column for column in columns if column not in self.positions]
+        if unknown:
+            raise KeyError(f"Unknown columns: {unknown}")
+        return [self.positions[column] for column in columns]
+
+    def ordered(self):
+        # Ring slots from oldest to newest
+        start = (self.head - self.count) % self.capacity
+        return (start + np.arange(self.count)) % self.capacity
+
+    def latest(self):
+        with self.lock:
+            if not self.count:
+                return {}
+            slot = (self.head - 1) % self.capacity
+            row = {"Timestamp": isotime(self.times[slot])}
+            row.update(zip(self.columns, json_values(self.values[slot])))
+            row["Weather"], row["Description"] = self.weather
+            return row
+
+    def window(self, minutes=None, resolution="raw", columns=None):
+        minutes = self.hours * 60 if minutes is None else min(minutes, self.hours * 60)
+        positions = self.column_positions(columns)
+        names = [self.columns[i] for i in positions]
+        with self.lock:
+            start = self.newest - minutes * 60
+            if resolution == "raw":
+                slots = self.ordered()
+                slots = slots[self.times[slots] >= start]
+                slots = slots[np.argsort(self.times[slots], kind="stable")]
+                result = {"Timestamp": [isotime(seconds) for seconds in self.times[slots]]}
+                for name, i in zip(names, positions):
+                    result[name] = json_values(self.values[slots, i])
+                return result
+            ring = self.bins[resolution]
+            slots = ring.since(start)
+            counts = ring.counts[slots][:, positions]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = ring.sums[slots][:, positions] / counts
+            result = {"Timestamp": [isotime(key * ring.width) for key in ring.keys[slots]]}
+            for j, name in enumerate(names):
+                result[name] = {
+                    "mean": json_values(means[:, j]),
+                    "min": json_values(np.where(counts[:, j] > 0, ring.mins[slots][:, positions[j]], np.nan)),
+                    "max": json_values(np.where(counts[:, j] > 0, ring.maxs[slots][:, positions[j]], np.nan)),
+                    "count": counts[:, j].tolist(),
+                }
+            return result
+
+    def compare(self, minutes=60):
+        # Mean power and energy of the three panels over the window, and the gain over fixed
+        minutes = min(minutes, self.hours * 60)
+        positions = self.column_positions(POWER_COLUMNS)
+        with self.lock:
+            slots = self.ordered()
+            slots = slots[self.times[slots] >= self.newest - minutes * 60]
+            slots = slots[np.argsort(self.times[slots], kind="stable")]
+            seconds = self.times[slots]
+            power = self.values[slots][:, positions]
+            runs = int(np.nansum(self.values[slots, self.positions["Just Calculated"]]))
+        result = {"minutes": minutes, "rows": len(slots), "tracking_runs": runs}
+        if len(slots) < 2:
+            return result
+        gaps = np.diff(seconds)
+        # Same rule as the energy accounting: no trapezoid across a gap
+        steps = np.where(gaps <= details.ENERGY_MAX_GAP, gaps, 0)
+        energy = np.nansum((power[1:] + power[:-1]) / 2 * steps[:, None], axis=0) / 3600
+        means = np.nanmean(power, axis=0)
+        result["from"], result["to"] = isotime(seconds[0]), isotime(seconds[-1])
+        for panel, mean, wh in zip(PANELS, means, energy):
+            result[panel] = {"mean_power(W)": round(float(mean), 6), "energy(Wh)": round(float(wh), 6)}
+        for panel, wh in zip(list(PANELS)[1:], energy[1:]):
+            net = wh - runs * details.SERVO_ENERGY_PER_RUN
+            result[panel]["net_energy(Wh)"] = round(float(net), 6)
+            result[panel]["gain_over_fixed(%)"] = round(float((net / energy[0] - 1) * 100), 3) if energy[0] > 0 else None
+        return result
+
+class LiveServer:
+    # Serves one buffer at /latest etc., or several (one per fleet device) at /<name>/latest
+    def __init__(self, buffers, host=None, port=None):
+        buffers = buffers if isinstance(buffers, dict) else {"": buffers}
+
+        class LiveHandler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                url = urlparse(handler.path)
+                parts = [part for part in url.path.split("/") if part]
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                name = "" if "" in buffers else (parts.pop(0) if parts else None)
+                try:
+                    if name not in buffers or len(parts) != 1 or parts[0] not in ("latest", "window", "compare"):
+                        status, body = 404, {"error": "not found", "routes": [f"/{device}/{route}".replace("//", "/") for device in buffers for route in ("latest", "window", "compare")]}
+                    else:
+                        status, body = 200, self.answer(buffers[name], parts[0], query)
+                except (KeyError, ValueError) as e:
+                    status, body = 400, {"error": str(e)}
+                content = json.dumps(body).encode()
+                handler.send_response(status)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(content)))
+                handler.end_headers()
+                handler.wfile.write(content)
+
+            def log_message(handler, format, *args):
+                pass
+
+        host = details.LIVE_HOST if host is None else host
+        port = details.LIVE_PORT if port is None else port
+        self.server = ThreadingHTTPServer((host, port), LiveHandler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="live-http", daemon=True)
+
+    def answer(self, buffer, route, query):
+        columns = query["columns"].split(",") if "columns" in query else None
+        if route == "latest":
+            return buffer.latest()
+        if route == "window":
+            resolution = query.get("resolution", "raw")
+            if resolution != "raw" and resolution not in RESOLUTIONS:
+                raise ValueError(f"resolution must be raw or one of {list(RESOLUTIONS)}")
+            # Raw rows default to the panel powers, a full row is a lot of JSON per second of data
+            if columns is None and resolution == "raw":
+                columns = POWER_COLUMNS
+            return buffer.window(float(query.get("minutes", 60)), resolution, columns)
+        return buffer.compare(float(query.get("minutes", 60)))
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def start_live_server(buffers):
+    # None when LIVE_PORT is None or the port is taken, the logger runs on either way
+    if details.LIVE_PORT is None:
+        return None
+    try:
+        return LiveServer(buffers).start()
+    except OSError as e:
+        print(f"Could not serve live data on port {details.LIVE_PORT}: {e}")
+        return None
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import bisect
+import threading
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import details
+
+# Always-on instrumentation for the logger loops. Each stage (resolving the ESP32 address,
+# connecting, waiting on recv, the weather call, writing the log file...) is timed into a
+# fixed-bucket histogram, so a gap in a logged day can be traced to where the time went.
+# Recording a timing is two perf_counter calls, a bisect and a lock, which is cheap next to
+# a single recv. The numbers are written to a JSON file every METRICS_INTERVAL seconds and
+# served as JSON on http://METRICS_HOST:METRICS_PORT/metrics.
+
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60)
+
+def bucket_label(bound):
+    return f"<={bound * 1000:g}ms" if bound < 1 else f"<={bound:g}s"
+
+class Histogram:
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        # One count per bound plus one for anything slower than the last bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.errors += error
+        self.total += seconds
+        self.last = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation, so it never under reports
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        labels = [bucket_label(bound) for bound in self.bounds] + [f">{bucket_label(self.bounds[-1])[2:]}"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean(ms)": round(self.total / self.count * 1000, 3) if self.count else None,
+            "last(ms)": round(self.last * 1000, 3),
+            "max(ms)": round(self.max * 1000, 3),
+            "p50(ms)": None if not self.count else round(self.quantile(0.5) * 1000, 3),
+            "p90(ms)": None if not self.count else round(self.quantile(0.9) * 1000, 3),
+            "p99(ms)": None if not self.count else round(self.quantile(0.99) * 1000, 3),
+            "buckets": {label: count for label, count in zip(labels, self.counts) if count},
+        }
+
+class Timer:
+    # with metrics.time("connect"): ... records the duration even if the block raises,
+    # in which case it is also counted as an error for that stage
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started, kind is not None)
+        return False
+
+class Metrics:
+    def __init__(self, window=None):
+        self.window = details.METRICS_RATE_WINDOW if window is None else window
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.stages = {}
+        self.counters = {}
+        self.rows = 0
+        self.last_sample = None
+        # (whole monotonic second, rows written in it) for the rolling rows/s
+        self.recent = deque()
+        self.attached = {}
+
+    def time(self, stage):
+        return Timer(self, stage)
+
+    def observe(self, stage, seconds, error=False):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds, error)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def sample(self, n=1):
+        # A row made it all the way to the sink
+        now = time.monotonic()
+        second = int(now)
+        with self.lock:
+            self.rows += n
+            self.last_sample = now
+            if self.recent and self.recent[-1][0] == second:
+                self.recent[-1][1] += n
+            else:
+                self.recent.append([second, n])
+            while self.recent[0][0] <= second - self.window:
+                self.recent.popleft()
+
+    def attach(self, name, stats):
+        # Other stats() methods (pipeline, source, supervisor) to include in every snapshot,
+        # attaching again under the same name replaces the previous one
+        with self.lock:
+            self.attached[name] = stats
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            uptime = now - self.started
+            window = min(self.window, uptime)
+            recent = sum(count for second, count in self.recent if second > now - self.window)
+            snapshot = {
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "uptime(s)": round(uptime, 1),
+                "rows": self.rows,
+                "rows/s": round(recent / window, 3) if window > 0 else 0.0,
+                "rows/s_total": round(self.rows / uptime, 3) if uptime > 0 else 0.0,
+                "since_last_sample(s)": None if self.last_sample is None else round(now - self.last_sample, 1),
+                "counters": dict(self.counters),
+                "stages": {stage: histogram.snapshot() for stage, histogram in self.stages.items()},
+            }
+            attached = list(self.attached.items())
+        for name, stats in attached:
+            try:
+                snapshot[name] = stats()
+            except Exception as e:
+                snapshot[name] = {"error": str(e)}
+        return snapshot
+
+# Shared by every part of a logger process unless one is given its own
+metrics = Metrics()
+
+def write_metrics_file(snapshot, path):
+    temporary = path + ".tmp"
+    with open(temporary, "w") as metrics_file:
+        json.dump(snapshot, metrics_file, indent=1, default=str)
+    os.replace(temporary, path)
+
+class MetricsFile:
+    def __init__(self, metrics, path, interval=None):
+        self.metrics = metrics
+        self.path = path
+        self.interval = details.METRICS_INTERVAL if interval is None else interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="metrics-file", daemon=True)
+
+    def write(self):
+        try:
+            write_metrics_file(self.metrics.snapshot(), self.path)
+        except OSError as e:
+            print(f"Error writing metrics to {self.path}: {e}")
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        # Leave the final numbers behind for after the logger has stopped
+        self.write()
+
+class MetricsServer:
+    def __init__(self, metrics, host=None, port=None):
+        self.metrics = metrics
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] not in ("/", "/metrics"):
+                    handler.send_error(404)
+                    return
+                content = json.dumps(metrics.snapshot(), default=str).encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(content)))
+                handler.end_headers()
+                handler.wfile.write(content)
+
+            def log_message(handler, format, *args):
+                pass
+
+        host = details.METRICS_HOST if host is None else host
+        port = details.METRICS_PORT if port is None else port
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def start_exporters(registry=None):
+    # The file and the endpoint from the details file; set METRICS_FILE or METRICS_PORT to None to turn one off
+    registry = metrics if registry is None else registry
+    exporters = []
+    if details.METRICS_FILE is not None:
+        exporters.append(MetricsFile(registry, os.path.join(details.BASE_PATH, details.METRICS_FILE)).start())
+    if details.METRICS_PORT is not None:
+        try:
+            exporters.append(MetricsServer(registry).start())
+        except OSError as e:
+            print(f"Could not serve metrics on port {details.METRICS_PORT}: {e}")
+    return exporters
+
+def stop_exporters(exporters):
+    for exporter in exporters:
+        exporter.stop()
+
+if __name__ == "__main__":
+    # Print a running logger's metrics, e.g. python LoggerMetrics.py
+    import urllib.request
+    with urllib.request.urlopen(f"http://{details.METRICS_HOST}:{details.METRICS_PORT}/metrics", timeout=5) as response:
+        print(json.dumps(json.load(response), indent=1))
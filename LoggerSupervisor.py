@@ -0,0 +1,160 @@
+import time
+import asyncio
+from datetime import datetime
+import details
+
+# Keeps the logger running inside one warm interpreter. The source and the sink are each
+# wrapped as a component; when one fails only that component is closed and rebuilt from its
+# factory, with exponential backoff, while the rest of the pipeline keeps its state.
+
+class Component:
+    def __init__(self, name, factory, max_backoff=None):
+        self.name = name
+        self.factory = factory
+        self.max_backoff = details.SUPERVISOR_MAX_BACKOFF if max_backoff is None else max_backoff
+        self.instance = None
+        self.backoff = min(1, self.max_backoff)
+        self.next_attempt = 0
+        self.starts = 0
+        self.failures = 0
+        self.down_since = None
+        self.downtime = 0.0
+
+    def get(self):
+        if self.instance is not None:
+            return self.instance
+        wait = self.next_attempt - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            self.instance = self.factory()
+        except Exception as e:
+            self.fail(e)
+            return None
+        self.starts += 1
+        if self.down_since is not None:
+            self.downtime += time.monotonic() - self.down_since
+            self.down_since = None
+        return self.instance
+
+    def ok(self):
+        # Only a component that has done useful work gets its backoff reset, so one that
+        # opens and then fails straight away still backs off
+        self.backoff = min(1, self.max_backoff)
+
+    def fail(self, error):
+        self.failures += 1
+        print(datetime.now().strftime('%H:%M:%S')+" "+f"{self.name} failed, restarting in {self.backoff}s: {error}")
+        if self.instance is not None and hasattr(self.instance, "close"):
+            try:
+                self.instance.close()
+            except Exception as e:
+                print(f"Error closing {self.name}: {e}")
+        self.instance = None
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+        self.next_attempt = time.monotonic() + self.backoff
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+
+    def stats(self):
+        downtime = self.downtime
+        if self.down_since is not None:
+            downtime += time.monotonic() - self.down_since
+        return {
+            "up": self.instance is not None,
+            "restarts": max(self.starts - 1, 0),
+            "failures": self.failures,
+            "downtime(s)": round(downtime, 1),
+        }
+
+class SupervisedSource:
+    def __init__(self, component):
+        self.component = component
+
+    def read(self):
+        source = self.component.get()
+        if source is None:
+            return None
+        try:
+            record = source.read()
+        except OSError as e:
+            self.component.fail(e)
+            return None
+        if record is not None:
+            self.component.ok()
+        return record
+
+class SupervisedSink:
+    def __init__(self, component):
+        self.component = component
+        self.pending = []
+
+    def append(self, data):
+        self.pending.append(data)
+        sink = self.component.get()
+        if sink is None:
+            return
+        try:
+            while self.pending:
+                # Once appended the row is the sink's, it keeps it buffered until written
+                sink.append(self.pending.pop(0))
+            self.component.ok()
+        except OSError as e:
+            # Rows the failed sink had buffered but not written are handed to its replacement,
+            # which files them under the day they were received
+            self.pending = list(getattr(sink, "buffer", [])) + self.pending
+            sink.buffer = []
+            self.component.fail(e)
+
+    def close(self):
+        sink = self.component.get()
+        if sink is not None:
+            for data in self.pending:
+                sink.append(data)
+            self.pending = []
+            sink.close()
+
+class Supervisor:
+    def __init__(self, max_backoff=None):
+        self.max_backoff = details.SUPERVISOR_MAX_BACKOFF if max_backoff is None else max_backoff
+        self.components = []
+        self.pipeline_restarts = 0
+        self.started = time.monotonic()
+
+    def add(self, name, factory):
+        component = Component(name, factory, self.max_backoff)
+        self.components.append(component)
+        return component
+
+    def source(self, name, factory):
+        return SupervisedSource(self.add(name, factory))
+
+    def sink(self, name, factory):
+        return SupervisedSink(self.add(name, factory))
+
+    def run(self, make_pipeline):
+        # Anything the components did not absorb brings down the pipeline itself, which is
+        # rebuilt around the same components rather than restarting the interpreter
+        backoff = min(1, self.max_backoff)
+        while True:
+            pipeline = make_pipeline()
+            started = time.monotonic()
+            try:
+                asyncio.run(pipeline.run())
+            except Exception as e:
+                self.pipeline_restarts += 1
+                print(datetime.now().strftime('%H:%M:%S')+" "+f"Pipeline stopped, restarting in {backoff}s: {e}")
+                print(self.stats())
+            finally:
+                pipeline.shutdown()
+            if time.monotonic() - started > 60:
+                backoff = min(1, self.max_backoff)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def stats(self):
+        uptime = time.monotonic() - self.started
+        stats = {"uptime(s)": round(uptime, 1), "pipeline_restarts": self.pipeline_restarts}
+        for component in self.components:
+            stats[component.name] = component.stats()
+        return stats
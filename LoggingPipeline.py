@@ -0,0 +1,209 @@
+import time
+import asyncio
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import details
+import LoggerMetrics
+
+# Column names for the 20 comma separated fields sent by sendData/sendDataBT, in order
+RECORD_COLUMNS = [
+    "Time Logged",
+    "Just Calculated",
+    "Fixed Panel Power(W)",
+    "SPA Panel Power(W)",
+    "Tracking Panel Power(W)",
+    "Fixed Panel Total Voltage(V)",
+    "SPA Panel Total Voltage(V)",
+    "Tracking Total Voltage(V)",
+    "Fixed Panel Millivoltage(V)",
+    "SPA Panel Millivoltage(V)",
+    "Tracking Millivoltage(V)",
+    "Fixed Panel Current(C)",
+    "SPA Panel Current(C)",
+    "Tracking Current(C)",
+    "SPA Azimuth",
+    "SPA Zenith",
+    "Spa Panel Rotate",
+    "Spa Panel Tilt",
+    "Tracking Panel Rotate",
+    "Tracking Panel Tilt",
+]
+
+WEATHER_COLUMNS = ["Temperature", "Weather", "Description", "Cloud Coverage", "Pressure", "Humidity", "Weather Age(s)"]
+
+class RecordError(ValueError):
+    # A record that could not be parsed, with its line for the quarantine file (DataValidation)
+    def __init__(self, reason, line):
+        super().__init__(f"{reason}: {line!r}")
+        self.reason = reason
+        self.line = line
+
+def parse_record(decodedData):
+    values = decodedData.strip().split(',')
+    if len(values) != len(RECORD_COLUMNS):
+        raise RecordError("field count", decodedData.strip())
+    try:
+        timeLog = str(values[0])
+        calc = int(values[1])
+        fixPow = float(values[2])
+        spaPow = float(values[3])
+        traPow = float(values[4])
+        fixTotVol = float(values[5])
+        spaTotVol = float(values[6])
+        traTotVol = float(values[7])
+        fixMilVol = float(values[8])
+        spaMilVol = float(values[9])
+        traMilVol = float(values[10])
+        fixCur = float(values[11])
+        spaCur = float(values[12])
+        traCur = float(values[13])
+        spaAzi = float(values[14])
+        spaZen = float(values[15])
+        serAzi = float(values[16])
+        serZen = float(values[17])
+        besRot = float(values[18])
+        besTil = float(values[19])
+    except ValueError:
+        raise RecordError("bad value", decodedData.strip()) from None
+    return timeLog,calc,fixPow,spaPow,traPow,fixTotVol,spaTotVol,traTotVol,fixMilVol,spaMilVol,traMilVol,fixCur,spaCur,traCur,spaAzi,spaZen,serAzi,serZen,besRot,besTil
+
+def build_row(record, timeRecieved, weather):
+    row = {"Time Recieved": timeRecieved}
+    row.update(zip(RECORD_COLUMNS, record))
+    row.update(zip(WEATHER_COLUMNS, weather))
+    return row
+
+class LoggingPipeline:
+    # Three stages connected by bounded queues:
+    #   produce - blocking source.read() in a worker thread, stamps the receive time
+    #   enrich  - adds the cached weather observation and builds the row
+    #   write   - hands rows to the sink on its own thread so disk time never stalls reads,
+    #             and to the energy accumulator (EnergyAccounting) and the in-memory
+    #             buffer of recent rows (LiveBuffer) when they are given
+    # With a validator (DataValidation) enrich checks every record first; rejected records and
+    # lines that could not be parsed are counted and quarantined instead of logged.
+    # A slow writer fills the row queue, which stalls enrich, which fills the record queue.
+    # The producer never waits on a full queue: it drops the oldest record so acquisition
+    # keeps up with the board, and counts what it dropped.
+    # Every stage is timed into metrics (LoggerMetrics), which also reports these stats.
+    def __init__(self, source, sink, weather, queue_size=None, retry_delay=None, metrics=None, energy=None, live=None, validator=None):
+        self.source = source
+        self.sink = sink
+        self.weather = weather
+        self.energy = energy
+        self.live = live
+        self.validator = validator
+        self.queue_size = details.PIPELINE_QUEUE_SIZE if queue_size is None else queue_size
+        self.retry_delay = details.PIPELINE_RETRY_DELAY if retry_delay is None else retry_delay
+        self.read_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="source")
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sink")
+        self.counters = {"read": 0, "enriched": 0, "written": 0, "dropped": 0, "failed_reads": 0, "failed_writes": 0, "empty_reads": 0, "quarantined": 0}
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.records = None
+        self.rows = None
+        self.metrics = LoggerMetrics.metrics if metrics is None else metrics
+        self.metrics.attach("pipeline", self.stats)
+        if energy is not None:
+            self.metrics.attach("energy", energy.stats)
+        if validator is not None:
+            self.metrics.attach("validation", validator.stats)
+
+    async def produce(self, records):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                with self.metrics.time("read"):
+                    record = await loop.run_in_executor(self.read_executor, self.source.read)
+            except RecordError as e:
+                # The connection is fine, go straight on to the next record
+                self.reject(e.line, datetime.now(), e.reason)
+                continue
+            except (OSError, ValueError, IndexError) as e:
+                self.counters["failed_reads"] += 1
+                print(datetime.now().strftime('%H:%M:%S')+" "+f"Failed to read record: {e}")
+                await asyncio.sleep(self.retry_delay)
+                continue
+            if record is None:
+                self.counters["empty_reads"] += 1
+                await asyncio.sleep(self.retry_delay)
+                continue
+            self.counters["read"] += 1
+            if records.full():
+                records.get_nowait()
+                records.task_done()
+                self.counters["dropped"] += 1
+            records.put_nowait((record, datetime.now(), time.monotonic()))
+
+    async def enrich(self, records, rows):
+        while True:
+            record, timeRecieved, received = await records.get()
+            if self.validator is not None:
+                reason = self.validator.check(record, timeRecieved)
+                if reason is not None:
+                    self.reject(record, timeRecieved, reason)
+                    records.task_done()
+                    continue
+            with self.metrics.time("enrich"):
+                row = build_row(record, timeRecieved, self.weather.current())
+            self.counters["enriched"] += 1
+            await rows.put((row, received))
+            records.task_done()
+
+    def reject(self, record, timeRecieved, reason):
+        self.counters["quarantined"] += 1
+        if self.validator is None:
+            print(datetime.now().strftime('%H:%M:%S')+" "+f"Skipped record ({reason}): {record}")
+            return
+        # Written from the writer thread like the rows
+        self.write_executor.submit(self.validator.quarantine, record, timeRecieved, reason)
+
+    def store(self, row):
+        # Runs on the writer thread, so the sink and the energy totals cost one hop from the loop.
+        # The live buffer goes first, it shows the latest rows even while the disk is failing.
+        if self.live is not None:
+            self.live.add(row)
+        self.sink.append(row)
+        if self.energy is not None:
+            try:
+                with self.metrics.time("energy"):
+                    self.energy.add(row)
+            except OSError as e:
+                print(f"Failed to save energy totals: {e}")
+
+    async def write(self, rows):
+        loop = asyncio.get_running_loop()
+        while True:
+            row, received = await rows.get()
+            try:
+                with self.metrics.time("write"):
+                    await loop.run_in_executor(self.write_executor, self.store, row)
+                self.counters["written"] += 1
+                self.metrics.sample()
+            except (OSError, ValueError) as e:
+                self.counters["failed_writes"] += 1
+                print(f"Failed to write row: {e}")
+            self.last_lag = time.monotonic() - received
+            self.max_lag = max(self.max_lag, self.last_lag)
+            # Time from the record arriving to it reaching the sink, including both queues
+            self.metrics.observe("lag", self.last_lag)
+            rows.task_done()
+
+    async def run(self):
+        records = asyncio.Queue(maxsize=self.queue_size)
+        rows = asyncio.Queue(maxsize=self.queue_size)
+        self.records = records
+        self.rows = rows
+        await asyncio.gather(self.produce(records), self.enrich(records, rows), self.write(rows))
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["max_lag(s)"] = round(self.max_lag, 3)
+        stats["last_lag(s)"] = round(self.last_lag, 3)
+        if self.records is not None:
+            stats["queued"] = self.records.qsize() + self.rows.qsize()
+        return stats
+
+    def shutdown(self):
+        self.read_executor.shutdown(wait=False, cancel_futures=True)
+        self.write_executor.shutdown(wait=True)
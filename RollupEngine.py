@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from DatasetCache import load_derived
+
+# Mean/min/max/count for every numeric column at every standard resolution, computed in one
+# vectorized pass over the raw rows. Rows are first reduced to one bin per logged second
+# (Time Logged has second precision), and every coarser resolution is then built from that
+# much smaller table, so the raw frame is scanned once however many resolutions are asked for.
+# Bins match the charts' existing dt.round() grouping: np.round is round-half-even too.
+
+RESOLUTIONS = {"1min": 60, "15min": 900, "30min": 1800, "1h": 3600}
+
+def numeric_columns(df):
+    return [column for column in df.columns if column != "Timestamp" and pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column])]
+
+def reduce_bins(sums, counts, mins, maxs, starts):
+    return (np.add.reduceat(sums, starts, axis=0), np.add.reduceat(counts, starts, axis=0),
+            np.fmin.reduceat(mins, starts, axis=0), np.fmax.reduceat(maxs, starts, axis=0))
+
+def build_table(keys, names, sums, counts, mins, maxs):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    data = {}
+    for i, name in enumerate(names):
+        data[f"{name}|mean"] = means[:, i]
+        data[f"{name}|min"] = mins[:, i]
+        data[f"{name}|max"] = maxs[:, i]
+        data[f"{name}|count"] = counts[:, i]
+    index = pd.DatetimeIndex(keys.astype("datetime64[s]"), name="Timestamp")
+    return pd.DataFrame(data, index=index)
+
+def compute_rollups(df):
+    # The Timestamp itself is carried as seconds so its min/max give each bin's first and last sample
+    seconds = df["Timestamp"].to_numpy("datetime64[s]").astype(np.int64)
+    order = np.argsort(seconds, kind="stable")
+    seconds = seconds[order]
+    names = numeric_columns(df) + ["Timestamp"]
+    values = np.column_stack([df[names[:-1]].to_numpy(dtype=np.float64)[order], seconds.astype(np.float64)])
+
+    present = ~np.isnan(values)
+    starts = np.flatnonzero(np.r_[True, seconds[1:] != seconds[:-1]])
+    keys = seconds[starts]
+    base = reduce_bins(np.where(present, values, 0.0), present.astype(np.int64), values, values, starts)
+
+    tables = {}
+    for resolution, width in RESOLUTIONS.items():
+        bins = np.round(keys / width).astype(np.int64) * width
+        bin_starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        tables[resolution] = build_table(bins[bin_starts], names, *reduce_bins(*base, bin_starts))
+    return tables
+
+def flatten_rollups(tables):
+    return pd.concat([table.reset_index().assign(Resolution=resolution) for resolution, table in tables.items()], ignore_index=True)
+
+def unflatten_rollups(flat):
+    return {resolution: table.drop(columns="Resolution").set_index("Timestamp") for resolution, table in flat.groupby("Resolution", sort=False)}
+
+def load_rollups(directory, filename):
+    flat = load_derived(directory, filename, "_rollups", lambda df: flatten_rollups(compute_rollups(df)))
+    return unflatten_rollups(flat)
+
+def select(table, stat="mean"):
+    # One statistic with the original column names, e.g. select(tables["15min"])["SPA Panel Power(W)"]
+    suffix = f"|{stat}"
+    columns = [column for column in table.columns if column.endswith(suffix)]
+    return table[columns].rename(columns=lambda column: column[:-len(suffix)])
+
+def rollup_means(directory, filename):
+    return {resolution: select(table, "mean") for resolution, table in load_rollups(directory, filename).items()}
+
+def coarsen(table, freq):
+    # Merge an existing rollup table into wider bins without going back to the raw rows
+    names = sorted({column.rsplit("|", 1)[0] for column in table.columns})
+    groups = table.index.floor(freq)
+    counts = table[[f"{name}|count" for name in names]].to_numpy()
+    sums = np.nan_to_num(table[[f"{name}|mean" for name in names]].to_numpy()) * counts
+    frame = pd.DataFrame(np.hstack([sums, counts]), index=groups)
+    summed = frame.groupby(level=0).sum()
+    totals = summed.to_numpy()
+    mins = table[[f"{name}|min" for name in names]].groupby(groups).min().to_numpy()
+    maxs = table[[f"{name}|max" for name in names]].groupby(groups).max().to_numpy()
+    keys = summed.index.to_numpy("datetime64[s]").astype(np.int64)
+    return build_table(keys, names, totals[:, :len(names)], totals[:, len(names):].astype(np.int64), mins, maxs)
+
+def load_range_rollups(directory, filenames, resolution, freq=None):
+    # Per-day tables carry only the time of day, the date is taken from the YYYY-MM-DD file name
+    tables = []
+    for filename in filenames:
+        table = load_rollups(directory, filename)[resolution]
+        day = pd.Timestamp(filename[:10])
+        table.index = day + (table.index - table.index.normalize())
+        tables.append(table)
+    table = pd.concat(tables).sort_index()
+    if freq is not None:
+        table = coarsen(table, freq)
+    return table
@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import numpy as np
+import details
+import spa
+
+# Per-site table of sun positions for one year, so positions can be looked up instead of
+# running the full SPA. Azimuth and zenith are stored every EPHEMERIS_STEP seconds as a raw
+# .npy file that is memory-mapped on load, with a .json file beside it holding the site, the
+# step and the worst interpolation error measured against spa.py when generated. The same
+# table at a coarser step is written as spa_ephemeris.h for the sketches.
+# The stored zenith is before the refraction correction, which switches on abruptly as the
+# sun rises and cannot be interpolated; it is added back, with incidence, after each lookup.
+
+COLUMNS = ["azimuth", "zenith", "incidence"]
+
+def table_path(year, directory=None):
+    directory = details.BASE_PATH if directory is None else directory
+    return os.path.join(directory, f"spa_ephemeris_{year}.npy")
+
+def table_times(year, step):
+    start = np.datetime64(f"{year}-01-01T00:00:00")
+    end = np.datetime64(f"{year + 1}-01-01T00:00:00")
+    # One extra point past the end so the last step of the year can still be interpolated
+    return np.arange(start, end + np.timedelta64(step, "s"), np.timedelta64(step, "s"))
+
+def compute_table(times):
+    position = spa.spa_calculate(times, spa.SPA_ZA)
+    return np.column_stack([position["azimuth"], 90.0 - position["e0"]]).astype(np.float32)
+
+def refract(azimuth, unrefracted_zenith):
+    e0 = 90.0 - unrefracted_zenith
+    zenith = 90.0 - (e0 + spa.atmospheric_refraction_correction(spa.SITE["pressure"], spa.SITE["temperature"], spa.SITE["atmos_refract"], e0))
+    incidence = spa.surface_incidence_angle(zenith, azimuth - 180.0, spa.SITE["azm_rotation"], spa.SITE["slope"])
+    return np.column_stack([azimuth, zenith, incidence]) if np.ndim(azimuth) else np.array([azimuth, zenith, incidence])
+
+def interpolate(table, start, step, times):
+    times = np.asarray(times, dtype="datetime64[ns]")
+    position = (times - start).astype(np.int64) / 1e9 / step
+    if np.any((position < 0) | (position > len(table) - 1)):
+        raise ValueError("Time outside the ephemeris table")
+    index = np.minimum(position.astype(np.int64), len(table) - 2)
+    fraction = (position - index)[:, None] if position.ndim else position - index
+    before = table[index].astype(np.float64)
+    after = table[index + 1].astype(np.float64)
+    change = after - before
+    # Azimuth wraps through north every night, so it is interpolated along the shorter way round
+    change[..., 0] = (change[..., 0] + 180.0) % 360.0 - 180.0
+    values = before + fraction * change
+    values[..., 0] %= 360.0
+    return refract(values[..., 0], values[..., 1])
+
+def measure_error(table, start, step, samples=20000, seed=0):
+    # Worst case against the exact SPA at random times, over all times and with the sun up
+    rng = np.random.default_rng(seed)
+    offsets = rng.uniform(0, (len(table) - 1) * step, samples)
+    times = start + (offsets * 1e9).astype("timedelta64[ns]")
+    looked_up = interpolate(table, start, step, times)
+    exact = np.column_stack(spa.sun_position(times))
+    error = np.abs(looked_up - exact)
+    error[:, 0] = np.minimum(error[:, 0], 360.0 - error[:, 0])
+    daylight = exact[:, 1] < 90.0
+    return {
+        "all": {name: round(float(error[:, i].max()), 5) for i, name in enumerate(COLUMNS)},
+        "daylight": {name: round(float(error[daylight, i].max()), 5) for i, name in enumerate(COLUMNS)},
+    }
+
+def generate(year, step=None, directory=None):
+    step = details.EPHEMERIS_STEP if step is None else step
+    times = table_times(year, step)
+    table = compute_table(times)
+    path = table_path(year, directory)
+    np.save(path, table)
+    metadata = {
+        "year": year,
+        "start": str(times[0]),
+        "step": step,
+        "columns": COLUMNS,
+        "site": spa.SITE,
+        "max_error": measure_error(table, times[0], step),
+    }
+    with open(os.path.splitext(path)[0] + ".json", "w") as metadata_file:
+        json.dump(metadata, metadata_file, indent=2)
+    return path, metadata
+
+class Ephemeris:
+    def __init__(self, year, directory=None):
+        path = table_path(year, directory)
+        with open(os.path.splitext(path)[0] + ".json") as metadata_file:
+            self.metadata = json.load(metadata_file)
+        self.table = np.load(path, mmap_mode="r")
+        self.start = np.datetime64(self.metadata["start"])
+        self.step = self.metadata["step"]
+        self.max_error = self.metadata["max_error"]
+
+    def lookup(self, times):
+        # (azimuth, zenith, incidence) like spa.sun_position, within max_error of it
+        values = interpolate(self.table, self.start, self.step, times)
+        return values[..., 0], values[..., 1], values[..., 2]
+
+def write_header(year, step=None, path="spa_ephemeris.h"):
+    # Zenith and azimuth in hundredths of a degree as uint16 in flash, the sketches do not use
+    # incidence. Day of year and seconds of day index the table, see ephemerisLookup.
+    pressure, temperature, atmos_refract = spa.SITE["pressure"], spa.SITE["temperature"], spa.SITE["atmos_refract"]
+    step = details.EPHEMERIS_HEADER_STEP if step is None else step
+    times = table_times(year, step)
+    table = compute_table(times)
+    zenith = np.round(table[:, 1].astype(np.float64) * 100).astype(np.uint16)
+    azimuth = np.round(table[:, 0].astype(np.float64) * 100).astype(np.uint16) % 36000
+    error = measure_error(np.column_stack([azimuth, zenith]) / 100.0, times[0], step)
+
+    def array(name, values):
+        rows = [",".join(str(value) for value in values[i:i + 24]) for i in range(0, len(values), 24)]
+        return f"const uint16_t {name}[EPHEMERIS_POINTS] PROGMEM = {{\n" + ",\n".join(rows) + "\n};\n"
+
+    with open(path, "w") as header:
+        header.write(f"""#ifndef SPA_EPHEMERIS_H
+#define SPA_EPHEMERIS_H
+
+#include <stdint.h>
+#include <math.h>
+
+// Generated by SolarEphemeris.py for {year} at latitude {spa.SITE["latitude"]}, longitude {spa.SITE["longitude"]},
+// elevation {spa.SITE["elevation"]} m. Linear interpolation every {step} s, largest error with the sun up
+// {error["daylight"]["zenith"]} deg zenith and {error["daylight"]["azimuth"]} deg azimuth. Regenerate for another year or site.
+#ifndef PROGMEM
+#define PROGMEM
+#define pgm_read_word(address) (*(const uint16_t *)(address))
+#endif
+
+#define EPHEMERIS_YEAR {year}
+#define EPHEMERIS_STEP {step}
+#define EPHEMERIS_POINTS {len(times)}
+#define EPHEMERIS_PRESSURE {float(pressure)}f
+#define EPHEMERIS_TEMPERATURE {float(temperature)}f
+#define EPHEMERIS_ATMOS_REFRACT {float(atmos_refract)}f
+
+""")
+        header.write(array("ephemerisZenith", zenith))
+        header.write("\n")
+        header.write(array("ephemerisAzimuth", azimuth))
+        header.write("""
+static inline int ephemerisDayOfYear(int year, int month, int day)
+{
+    static const int daysBefore[12] = {0,31,59,90,120,151,181,212,243,273,304,334};
+    int leap = (year % 4 == 0 && year % 100 != 0) || year % 400 == 0;
+    return daysBefore[month - 1] + day + (leap && month > 2 ? 1 : 0);
+}
+
+static inline void ephemerisLookup(int dayOfYear, unsigned long secondsOfDay, float *zenith, float *azimuth)
+{
+    unsigned long seconds = (unsigned long)(dayOfYear - 1) * 86400UL + secondsOfDay;
+    unsigned long index = seconds / EPHEMERIS_STEP;
+    if(index > EPHEMERIS_POINTS - 2)
+    {
+        index = EPHEMERIS_POINTS - 2;
+    }
+    float fraction = (float)(seconds - index * EPHEMERIS_STEP) / EPHEMERIS_STEP;
+    float zenithBefore = pgm_read_word(&ephemerisZenith[index]) / 100.0f;
+    float zenithAfter = pgm_read_word(&ephemerisZenith[index + 1]) / 100.0f;
+    float azimuthBefore = pgm_read_word(&ephemerisAzimuth[index]) / 100.0f;
+    float azimuthChange = pgm_read_word(&ephemerisAzimuth[index + 1]) / 100.0f - azimuthBefore;
+    if(azimuthChange > 180.0f) azimuthChange -= 360.0f;
+    if(azimuthChange < -180.0f) azimuthChange += 360.0f;
+    // Refraction correction from spa.cpp, added after interpolating the unrefracted zenith
+    float elevation = 90.0f - (zenithBefore + fraction * (zenithAfter - zenithBefore));
+    if(elevation >= -(0.26667f + EPHEMERIS_ATMOS_REFRACT))
+    {
+        elevation += (EPHEMERIS_PRESSURE / 1010.0f) * (283.0f / (273.0f + EPHEMERIS_TEMPERATURE)) *
+                     1.02f / (60.0f * tanf((elevation + 10.3f / (elevation + 5.11f)) * (float)M_PI / 180.0f));
+    }
+    *zenith = 90.0f - elevation;
+    *azimuth = azimuthBefore + fraction * azimuthChange;
+    if(*azimuth < 0.0f) *azimuth += 360.0f;
+    if(*azimuth >= 360.0f) *azimuth -= 360.0f;
+}
+
+#endif
+""")
+    return path, error
+
+if __name__ == "__main__":
+    # Build the host table and the sketch header for a year, e.g. python SolarEphemeris.py 2025
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else int(str(np.datetime64("today", "Y")))
+    path, metadata = generate(year)
+    print(f"Saved {path}, largest error {metadata['max_error']['all']}")
+    path, error = write_header(year)
+    print(f"Saved {path}, largest error with the sun up {error['daylight']}")
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from LoggingPipeline import RECORD_COLUMNS
+
+# Host side of telemetry_frame.h. A received buffer holding many back to back frames is
+# viewed as a structured array with np.frombuffer, so there is no per-field Python work.
+
+TELEMETRY_MAGIC = 0x5AA5
+TELEMETRY_VERSION = 1
+MAGIC_BYTES = TELEMETRY_MAGIC.to_bytes(2, "little")
+
+FIELD_NAMES = ["fixPow", "spaPow", "traPow", "fixTotVol", "spaTotVol", "traTotVol", "fixMilVol", "spaMilVol", "traMilVol", "fixCur", "spaCur", "traCur", "spaAzi", "spaZen", "serAzi", "serZen", "besRot", "besTil"]
+
+FRAME_DTYPE = np.dtype(
+    [("magic", "<u2"), ("version", "u1"), ("calc", "u1"), ("seq", "<u4"), ("timeOfDay", "<u4")]
+    + [(name, "<f4") for name in FIELD_NAMES]
+    + [("checksum", "<u2")]
+)
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+def encode_frames(seq, calc, timeOfDay, fields):
+    # Same bytes the sketch sends, used by the emulator and benchmarks
+    seq = np.atleast_1d(seq)
+    frames = np.zeros(len(seq), dtype=FRAME_DTYPE)
+    frames["magic"] = TELEMETRY_MAGIC
+    frames["version"] = TELEMETRY_VERSION
+    frames["seq"] = seq
+    frames["calc"] = calc
+    frames["timeOfDay"] = timeOfDay
+    fields = np.atleast_2d(fields)
+    for i, name in enumerate(FIELD_NAMES):
+        frames[name] = fields[:, i]
+    raw = frames.view(np.uint8).reshape(len(frames), FRAME_SIZE)
+    frames["checksum"] = raw[:, :-2].sum(axis=1, dtype=np.uint32) & 0xFFFF
+    return frames.tobytes()
+
+def frame_is_valid(frames):
+    raw = frames.view(np.uint8).reshape(len(frames), FRAME_SIZE)
+    checksum = raw[:, :-2].sum(axis=1, dtype=np.uint32) & 0xFFFF
+    return (frames["magic"] == TELEMETRY_MAGIC) & (frames["version"] == TELEMETRY_VERSION) & (checksum == frames["checksum"])
+
+def find_frame_starts(buffer):
+    # Only used to resynchronise after corrupt bytes, walks candidate magic positions
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    candidates = np.flatnonzero((data[:-1] == MAGIC_BYTES[0]) & (data[1:] == MAGIC_BYTES[1]))
+    starts = []
+    position = 0
+    for start in candidates:
+        if start < position or start + FRAME_SIZE > len(data):
+            continue
+        frame = np.frombuffer(buffer, dtype=FRAME_DTYPE, count=1, offset=int(start))
+        if frame_is_valid(frame)[0]:
+            starts.append(start)
+            position = start + FRAME_SIZE
+    return np.asarray(starts, dtype=np.int64), position
+
+def decode_frames(buffer):
+    # Returns (frames, consumed, skipped). frames is a read-only view into buffer when it is
+    # aligned and clean, consumed is how many bytes of buffer were used up and skipped is how
+    # many of those were corrupt bytes thrown away while resynchronising.
+    count = len(buffer) // FRAME_SIZE
+    if count:
+        frames = np.frombuffer(buffer, dtype=FRAME_DTYPE, count=count)
+        if frame_is_valid(frames).all():
+            return frames, count * FRAME_SIZE, 0
+    starts, position = find_frame_starts(buffer)
+    if len(starts) == 0:
+        # Keep a possible partial frame at the end, discard everything before it
+        consumed = max(0, len(buffer) - (FRAME_SIZE - 1))
+        return np.zeros(0, dtype=FRAME_DTYPE), consumed, consumed
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    frames = data[starts[:, None] + np.arange(FRAME_SIZE)].reshape(-1).view(FRAME_DTYPE)
+    return frames, position, position - len(frames) * FRAME_SIZE
+
+def time_logged(frames):
+    seconds = frames["timeOfDay"].astype(np.int64)
+    return pd.to_datetime(seconds, unit="s").strftime("%H:%M:%S")
+
+def frames_to_dataframe(frames):
+    df = pd.DataFrame({name: frames[name] for name in FIELD_NAMES})
+    df.columns = RECORD_COLUMNS[2:]
+    df.insert(0, "Just Calculated", frames["calc"].astype(np.int64))
+    df.insert(0, "Time Logged", time_logged(frames))
+    df["Sequence"] = frames["seq"]
+    return df
+
+def frames_to_records(frames):
+    # Tuples in the same shape parse_record returns, for the logging pipeline. Values are
+    # rounded to the 5 decimals the ASCII record carries so both formats log identically.
+    columns = [time_logged(frames), frames["calc"].astype(np.int64)] + [np.round(frames[name].astype(np.float64), 5) for name in FIELD_NAMES]
+    return list(zip(*(np.asarray(column).tolist() for column in columns)))
@@ -0,0 +1,266 @@
+import sys
+import math
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import details
+import spa
+from DatasetCache import load_day
+
+# Replays logged days against a model of panel power versus angle, to compare ways of finding
+# the best angle every SEARCH_INTERVAL seconds with the 3x3 grid in trackingCall.
+# The SPA panel is held at the sun by servoMove, so its logged power, divided by how well it
+# actually faced the sun, gives the power available at each row. Any other angle gets the
+# direct part of that scaled by the cosine of its angle to the sun (spa.py geometry), plus a
+# diffuse part that grows with the logged cloud coverage.
+
+SEARCH_INTERVAL = 300
+SETTLE_SECONDS = 2
+ROTATE_LIMITS = (0, 180)
+TILT_LIMITS = (0, 90)
+DIFFUSE_MIN = 0.15
+# Wh per servo move: the energy charged per tracking run (details.SERVO_ENERGY_PER_RUN, the same
+# figure the energy accounting uses) spread over the ten moves a run of the grid makes
+MOVE_COST = details.SERVO_ENERGY_PER_RUN / 10
+
+def trapezoid_wh(power, seconds):
+    return float(((power[1:] + power[:-1]) / 2 * np.diff(seconds)).sum() / 3600)
+
+def servo_angles(azimuth, zenith):
+    # Same mapping as servoMove: tilt is the sun elevation, rotate 0-180 spans east to west
+    return np.clip(azimuth - 90, *ROTATE_LIMITS), np.clip(90 - zenith, *TILT_LIMITS)
+
+def direction(azimuth, elevation):
+    azimuth, elevation = np.radians(azimuth), np.radians(elevation)
+    return np.stack([np.cos(elevation) * np.sin(azimuth), np.cos(elevation) * np.cos(azimuth), np.sin(elevation)], axis=-1)
+
+class DayModel:
+    def __init__(self, df, day, timezone=0.0):
+        df = df.sort_values("Timestamp")
+        times = np.datetime64(day) + (df["Timestamp"] - df["Timestamp"].dt.normalize()).to_numpy()
+        self.seconds = (times - times[0]).astype("timedelta64[ms]").astype(np.int64) / 1000.0
+        self.start = times[0]
+        azimuth, zenith, _ = spa.sun_position(times, timezone=timezone)
+        self.sun_azimuth, self.sun_zenith = azimuth, zenith
+        self.sun = direction(azimuth, 90 - zenith)
+        if "Cloud Coverage" in df.columns:
+            clouds = df["Cloud Coverage"].fillna(0).to_numpy(dtype=np.float64)
+        else:
+            clouds = np.zeros(len(df))
+        self.diffuse = DIFFUSE_MIN + (1 - DIFFUSE_MIN) * np.clip(clouds, 0, 100) / 100
+        self.fixed = df["Fixed Panel Power(W)"].to_numpy(dtype=np.float64)
+        self.logged_spa = df["SPA Panel Power(W)"].to_numpy(dtype=np.float64)
+        self.logged_tracking = df["Tracking Panel Power(W)"].to_numpy(dtype=np.float64)
+        # Undo the SPA panel's own pointing loss, which is large when its rotate servo hits a limit
+        spa_factor = self.factor(np.arange(len(df)), df["Spa Panel Rotate"].to_numpy(dtype=np.float64), df["Spa Panel Tilt"].to_numpy(dtype=np.float64))
+        self.available = self.logged_spa / np.maximum(spa_factor, 0.2)
+
+    def factor(self, rows, rotate, tilt):
+        cosine = np.einsum("...i,...i->...", direction(np.asarray(rotate) + 90, tilt), self.sun[rows])
+        cosine = np.where(self.sun[rows, 2] > 0, np.maximum(cosine, 0), 0)
+        return (1 - self.diffuse[rows]) * cosine + self.diffuse[rows]
+
+    def row(self, second):
+        return min(np.searchsorted(self.seconds, second, side="right") - 1, len(self.seconds) - 1)
+
+    def power(self, rows, rotate, tilt):
+        return self.available[rows] * self.factor(rows, rotate, tilt)
+
+    def energy(self, first, last, rotate, tilt):
+        # Wh for holding one angle over rows first..last, trapezoidal over the logged times
+        if last <= first:
+            return 0.0
+        rows = np.arange(first, last + 1)
+        return trapezoid_wh(self.power(rows, rotate, tilt), self.seconds[rows])
+
+class Probe:
+    # What a strategy sees of the rig: moving to an angle costs a servo move and the settle
+    # delay, and the power read there is for the moment the reading is taken
+    def __init__(self, model, second, rotate, tilt):
+        self.model = model
+        self.second = second
+        self.rotate = rotate
+        self.tilt = tilt
+        self.moves = 0
+        self.probes = 0
+        self.energy = 0.0
+
+    def move(self, rotate, tilt):
+        rotate = float(np.clip(rotate, *ROTATE_LIMITS))
+        tilt = float(np.clip(tilt, *TILT_LIMITS))
+        if (int(rotate), int(tilt)) != (int(self.rotate), int(self.tilt)):
+            self.moves += 1
+        self.rotate, self.tilt = rotate, tilt
+        return rotate, tilt
+
+    def read(self, rotate, tilt):
+        rotate, tilt = self.move(rotate, tilt)
+        self.second += SETTLE_SECONDS
+        self.probes += 1
+        power = float(self.model.power(self.model.row(self.second), rotate, tilt))
+        self.energy += power * SETTLE_SECONDS / 3600
+        return power
+
+def best_of(probe, points):
+    best = (0.0, probe.rotate, probe.tilt)
+    for rotate, tilt in points:
+        power = probe.read(rotate, tilt)
+        if power > best[0]:
+            best = (power, probe.rotate, probe.tilt)
+    return best
+
+def grid3x3(probe, rotate, tilt):
+    return best_of(probe, [(rotate + i * 10, tilt + j * 10) for i in (-1, 0, 1) for j in (-1, 0, 1)])
+
+def azimuth_only(probe, rotate, tilt):
+    return best_of(probe, [(rotate + i * 10, tilt) for i in (-1, 0, 1)])
+
+def zenith_only(probe, rotate, tilt):
+    return best_of(probe, [(rotate, tilt + i * 10) for i in (-1, 0, 1)])
+
+def spa_only(probe, rotate, tilt):
+    return 0.0, rotate, tilt
+
+def hill_climb(probe, rotate, tilt, step=10, min_step=2.5, max_probes=9):
+    best = (probe.read(rotate, tilt), probe.rotate, probe.tilt)
+    while step >= min_step and probe.probes < max_probes:
+        moved = False
+        for d_rotate, d_tilt in ((step, 0), (-step, 0), (0, step), (0, -step)):
+            if probe.probes >= max_probes:
+                break
+            power = probe.read(best[1] + d_rotate, best[2] + d_tilt)
+            if power > best[0]:
+                best = (power, probe.rotate, probe.tilt)
+                moved = True
+                break
+        if not moved:
+            step /= 2
+    return best
+
+def golden_section(probe, rotate, tilt, span=15, iterations=3):
+    # One axis at a time, rotate then tilt, each over +-span around the SPA angle
+    ratio = (math.sqrt(5) - 1) / 2
+    best = (0.0, rotate, tilt)
+    for axis in (0, 1):
+        centre = [best[1], best[2]]
+        low, high = centre[axis] - span, centre[axis] + span
+
+        def read(value):
+            point = list(centre)
+            point[axis] = value
+            return probe.read(*point)
+
+        x1, x2 = high - ratio * (high - low), low + ratio * (high - low)
+        p1, p2 = read(x1), read(x2)
+        for _ in range(iterations):
+            if p1 > p2:
+                high, x2, p2 = x2, x1, p1
+                x1 = high - ratio * (high - low)
+                p1 = read(x1)
+            else:
+                low, x1, p1 = x1, x2, p2
+                x2 = low + ratio * (high - low)
+                p2 = read(x2)
+        value, power = (x1, p1) if p1 > p2 else (x2, p2)
+        if power > best[0]:
+            centre[axis] = value
+            best = (power, *np.clip(centre, [ROTATE_LIMITS[0], TILT_LIMITS[0]], [ROTATE_LIMITS[1], TILT_LIMITS[1]]))
+    return best
+
+def pattern_search(probe, rotate, tilt, step=5, min_step=1.25, max_probes=9):
+    # Compass search seeded at the SPA angle, which is usually close, so steps start small
+    best = (probe.read(rotate, tilt), probe.rotate, probe.tilt)
+    while step >= min_step and probe.probes < max_probes:
+        improved = False
+        for d_rotate, d_tilt in ((step, 0), (-step, 0), (0, step), (0, -step)):
+            if probe.probes >= max_probes:
+                break
+            power = probe.read(best[1] + d_rotate, best[2] + d_tilt)
+            if power > best[0]:
+                best = (power, probe.rotate, probe.tilt)
+                improved = True
+        if not improved:
+            step /= 2
+    return best
+
+STRATEGIES = {
+    "spa_only": spa_only,
+    "grid3x3": grid3x3,
+    "azimuth_only": azimuth_only,
+    "zenith_only": zenith_only,
+    "hill_climb": hill_climb,
+    "golden_section": golden_section,
+    "pattern_search": pattern_search,
+}
+
+def simulate(model, strategy):
+    search = STRATEGIES[strategy]
+    rotate, tilt = ROTATE_LIMITS[1] / 2, 55.0
+    energy = moves = probes = search_time = 0.0
+    calls = 0
+    second = model.seconds[0]
+    end = model.seconds[-1]
+    while second <= end:
+        row = model.row(second)
+        spa_rotate, spa_tilt = servo_angles(model.sun_azimuth[row], model.sun_zenith[row])
+        probe = Probe(model, second, rotate, tilt)
+        probe.move(spa_rotate, spa_tilt)
+        power, best_rotate, best_tilt = search(probe, float(spa_rotate), float(spa_tilt))
+        if power <= 0:
+            # Like trackingCall, nothing better was read so the panel is left at the SPA angle
+            best_rotate, best_tilt = spa_rotate, spa_tilt
+        probe.move(best_rotate, best_tilt)
+        rotate, tilt = probe.rotate, probe.tilt
+        next_call = second + SEARCH_INTERVAL
+        first = model.row(probe.second)
+        last = model.row(min(next_call, end))
+        energy += probe.energy + model.energy(first, last, rotate, tilt)
+        moves += probe.moves
+        probes += probe.probes
+        search_time += probe.second - second
+        calls += 1
+        second = next_call
+    servo_cost = moves * MOVE_COST
+    return {
+        "strategy": strategy,
+        "calls": calls,
+        "probes": int(probes),
+        "moves": int(moves),
+        "search_time(s)": search_time,
+        "energy(Wh)": energy,
+        "servo_cost(Wh)": servo_cost,
+        "net_energy(Wh)": energy - servo_cost,
+    }
+
+def logged_energy(model):
+    return {
+        "fixed(Wh)": trapezoid_wh(model.fixed, model.seconds),
+        "spa(Wh)": trapezoid_wh(model.logged_spa, model.seconds),
+        "tracking(Wh)": trapezoid_wh(model.logged_tracking, model.seconds),
+    }
+
+def run_one(directory, filename, strategy, timezone=0.0):
+    # Each worker loads the day through the dataset cache, so only the first load parses it
+    model = DayModel(load_day(directory, filename), filename[:10], timezone)
+    return {"day": filename[:10], **simulate(model, strategy), **logged_energy(model)}
+
+def run_all(directory, filenames, strategies=None, workers=None, timezone=0.0):
+    strategies = list(STRATEGIES) if strategies is None else strategies
+    for filename in filenames:
+        # Parse each day once up front so parallel workers do not race to build its cache. Only
+        # the cache file is needed here, the parent does not keep the days in memory
+        load_day(directory, filename, memo=False)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_one, directory, filename, strategy, timezone) for filename in filenames for strategy in strategies]
+        rows = [future.result() for future in futures]
+    return pd.DataFrame(rows)
+
+if __name__ == "__main__":
+    # Compare strategies over logged days, e.g. python TrackingSimulator.py 2024-04-16_data.xlsx 2024-04-17_data.xlsx
+    filenames = sys.argv[1:]
+    if not filenames:
+        print("Usage: python TrackingSimulator.py <day file> [<day file> ...]")
+        sys.exit(1)
+    results = run_all(details.BASE_PATH, filenames)
+    pd.set_option("display.width", 200)
+    print(results.groupby("strategy")[["net_energy(Wh)", "energy(Wh)", "moves", "search_time(s)"]].sum().sort_values("net_energy(Wh)", ascending=False))
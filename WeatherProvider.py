@@ -0,0 +1,101 @@
+import time
+import json
+import threading
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import details
+import LoggerMetrics
+
+url_base = "http://api.openweathermap.org/data/2.5/weather?"
+assembledUrl = url_base + "appid=" + details.API_KEY + "&q=" + details.LOCATION
+
+def get_openweathermap_data(assembledUrl, timeout=10):
+    response = requests.get(assembledUrl, timeout=timeout).json()
+    temp = response['main']['temp']
+    weat = response['weather'][0]['main']
+    des = response['weather'][0]['description']
+    clo = response['clouds']['all']
+    pres = response['main']['pressure']
+    hum = response['main']['humidity']
+    # dt is when OpenWeatherMap calculated the observation, not when we fetched it
+    observed = response.get('dt', time.time())
+    return temp, weat, des, clo, pres, hum, observed
+
+class WeatherProvider:
+    # Weather changes over minutes, so it is fetched on a background thread every ttl seconds
+    # and the loggers read the last good observation without touching the network.
+    def __init__(self, url=None, ttl=None):
+        self.url = assembledUrl if url is None else url
+        self.ttl = details.WEATHER_TTL if ttl is None else ttl
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.observation = None
+        self.observed = None
+        self.failures = 0
+
+    def refresh(self):
+        try:
+            with LoggerMetrics.metrics.time("weather"):
+                temp, weat, des, clo, pres, hum, observed = get_openweathermap_data(self.url)
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+            self.failures += 1
+            LoggerMetrics.metrics.count("failed_weather")
+            print(f"Error fetching weather, keeping last observation: {e}")
+            return False
+        with self.lock:
+            self.observation = (temp, weat, des, clo, pres, hum)
+            self.observed = observed
+        return True
+
+    def run(self):
+        while not self.stop_event.wait(self.ttl):
+            self.refresh()
+
+    def start(self):
+        self.refresh()
+        self.thread = threading.Thread(target=self.run, name="weather", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def current(self):
+        with self.lock:
+            observation = self.observation
+            observed = self.observed
+        if observation is None:
+            return None, None, None, None, None, None, None
+        age = round(time.time() - observed, 1)
+        return observation + (age,)
+
+def serve_fake_weather(payload=None, port=0):
+    # Local stand-in for OpenWeatherMap, point WeatherProvider(url=...) at the returned url
+    if payload is None:
+        payload = {
+            "main": {"temp": 283.15, "pressure": 1013, "humidity": 80},
+            "weather": [{"main": "Clouds", "description": "scattered clouds"}],
+            "clouds": {"all": 40},
+        }
+
+    class FakeWeatherHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = dict(payload)
+            body.setdefault("dt", int(time.time()))
+            content = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeWeatherHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/data/2.5/weather"
+    return server, url
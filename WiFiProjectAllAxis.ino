@@ -48,6 +48,7 @@
 #include "esp_wpa2.h"
 #include "private_details.h"
 #include "spa.h"
+#include "telemetry_frame.h"
 #include <Wire.h>
 #include <Adafruit_GFX.h>
 #include <Adafruit_SSD1306.h>
@@ -65,9 +66,16 @@
 #define clientLedPin 4
 #define SCREEN_WIDTH 128 // OLED display width, in pixels
 #define SCREEN_HEIGHT 64 // OLED display height, in pixels
+#define TELEMETRY_BINARY 0 // 1 sends telemetry_frame.h frames, set TELEMETRY_BINARY = True in details.py to match
+#define USE_SPA_EPHEMERIS 0 // 1 looks the sun position up in spa_ephemeris.h (python SolarEphemeris.py <year>) instead of running spa_calculate
+
+#if USE_SPA_EPHEMERIS
+#include "spa_ephemeris.h"
+#endif
 
 // WiFi server creation
 WiFiServer server(80);
+WiFiClient streamClient;
 WiFiUDP ntpUDP;
 NTPClient timeClient(ntpUDP);
 Adafruit_SSD1306 display(SCREEN_WIDTH, SCREEN_HEIGHT, &Wire, -1);
@@ -96,6 +104,7 @@ float servoZenith = 0;
 float servoAzimuth = 0;
 float bestRotateAngle = 0;
 float bestTiltAngle = 0;
+uint32_t telemetrySequence = 0;
 
 // Function definitions
 void lcdStartup();
@@ -105,11 +114,14 @@ void getTime(String &timeStamp);
 unsigned long getTimeInSeconds(String timeStamp);
 void servoSetup();
 void solarPositionAlgorithmUpdate(spa_data *spa,String dateStamp,String timeStamp);
+bool ephemerisUpdate(spa_data *spa,String dateStamp,String timeStamp);
 void servoMove(spa_data spa,float &servoZenith,float &servoAzimuth);
 void readPanelAndCalculatePower(float &resistorMilliVolts,int panelPin,float &circuitCurrent,float &measureResistor,float &fixedResistor,float &circuitTotalVoltage,float &panelPower);
 void trackingCall(float servoZenith,float servoAzimuth,float &bestRotateAngle,float &bestTiltAngle,float &resistorMilliVoltsTrackingPanel,int panelPin,float &circuitCurrentTrackingPanel,float &measureResistorTrackingPanel,float &fixedResistorTrackingPanel,float &circuitTotalVoltageTrackingPanel,float &trackingPanelPower);
 void lcdDisplayPower(float trackingPanelPower,float referencePanelPower,float spaPanelPower);
+void waitForClient();
 void sendData(String formatedData);
+void sendFrame(int calculated, unsigned long timeInSeconds, const float *fields);
  
 void setup()
 { 
@@ -126,7 +138,6 @@ void setup()
 void loop()
 {
   Serial.begin(115200);
-  WiFiClient client = server.available();
 
   // Variable declarations
   float resistorMilliVoltsTrackingPanel = 0;
@@ -150,8 +161,17 @@ void loop()
   unsigned long timeInSeconds = getTimeInSeconds(timeStamp);
   if((timeInSeconds - lastCallTime) >= 300)
   {
+#if USE_SPA_EPHEMERIS
+    // The header only covers EPHEMERIS_YEAR, in any other year the SPA is run as usual
+    if(!ephemerisUpdate(&spa,dateStamp,timeStamp))
+    {
+      solarPositionAlgorithmUpdate(&spa,dateStamp,timeStamp);
+      result = spa_calculate(&spa);
+    }
+#else
     solarPositionAlgorithmUpdate(&spa,dateStamp,timeStamp);
     result = spa_calculate(&spa);
+#endif
     servoMove(spa,servoZenith,servoAzimuth);
     trackingCall(servoZenith,servoAzimuth,bestRotateAngle,bestTiltAngle,resistorMilliVoltsTrackingPanel,3,circuitCurrentTrackingPanel,circuitTotalVoltageTrackingPanel,trackingPanelPower);
     lastCallTime = timeInSeconds;
@@ -161,11 +181,18 @@ void loop()
   readPanelAndCalculatePower(resistorMilliVoltsSpaPanel,2,circuitCurrentSpaPanel,circuitTotalVoltageSpaPanel,spaPanelPower);
   readPanelAndCalculatePower(resistorMilliVoltsTrackingPanel,3,circuitCurrentTrackingPanel,circuitTotalVoltageTrackingPanel,trackingPanelPower);
   lcdDisplayPower(trackingPanelPower,referencePanelPower,spaPanelPower);
+#if TELEMETRY_BINARY
+  float fields[TELEMETRY_FIELDS] = {referencePanelPower,spaPanelPower,trackingPanelPower,circuitTotalVoltageReferencePanel,circuitTotalVoltageSpaPanel,circuitTotalVoltageTrackingPanel,
+                                    resistorMilliVoltsReferencePanel,resistorMilliVoltsSpaPanel,resistorMilliVoltsTrackingPanel,circuitCurrentReferencePanel,circuitCurrentSpaPanel,circuitCurrentTrackingPanel,
+                                    spa.azimuth,spa.zenith,servoAzimuth,servoZenith,bestRotateAngle,bestTiltAngle};
+  sendFrame(calculated,timeInSeconds,fields);
+#else
   String formatedData= " ";
   formatedData = String(timeStamp)+","+String(calculated)+","+String(referencePanelPower,5)+","+String(spaPanelPower,5)+","+String(trackingPanelPower,5)+","+String(circuitTotalVoltageReferencePanel,5)+","+String(circuitTotalVoltageSpaPanel,5)+","+String(circuitTotalVoltageTrackingPanel,5);
   formatedData = formatedData+","+String(resistorMilliVoltsReferencePanel,5)+","+String(resistorMilliVoltsSpaPanel,5)+","+String(resistorMilliVoltsTrackingPanel,5)+","+String(circuitCurrentReferencePanel,5)+","+String(circuitCurrentSpaPanel,5)+","+String(circuitCurrentTrackingPanel,5);
   formatedData = formatedData+","+String(spa.azimuth,5)+","+String(spa.zenith,5)+","+String(servoAzimuth,5)+","+String(servoZenith,5)+","+String(bestRotateAngle,5)+","+String(bestTiltAngle,5);
   sendData(formatedData);
+#endif
 }
 
 void lcdStartup()
@@ -292,6 +319,26 @@ void solarPositionAlgorithmUpdate(spa_data *spa,String dateStamp,String timeStam
   spa->function      = SPA_ALL;
 }
 
+#if USE_SPA_EPHEMERIS
+bool ephemerisUpdate(spa_data *spa,String dateStamp,String timeStamp)
+{
+  // A header generated for another year (or a clock that has not been set yet) would give
+  // positions for the wrong day, so only look up dates in EPHEMERIS_YEAR
+  int year = dateStamp.substring(0,4).toInt();
+  if(year != EPHEMERIS_YEAR)
+  {
+    return false;
+  }
+  int dayOfYear = ephemerisDayOfYear(year,dateStamp.substring(5,7).toInt(),dateStamp.substring(8,10).toInt());
+  float zenith = 0;
+  float azimuth = 0;
+  ephemerisLookup(dayOfYear,getTimeInSeconds(timeStamp),&zenith,&azimuth);
+  spa->zenith = zenith;
+  spa->azimuth = azimuth;
+  return true;
+}
+#endif
+
 void servoMove(spa_data spa,float &servoZenith,float &servoAzimuth)
 {
   float zenith = spa.zenith;
@@ -393,15 +440,32 @@ void lcdDisplayPower(float trackingPanelPower,float referencePanelPower,float sp
   display.display(); 
 }
 
-void sendData(String formatedData)
+void waitForClient()
 {
-  WiFiClient client = server.available(); 
-  digitalWrite(clientLedPin, HIGH);
-  while(!client)
+  // Keep the logger's connection open and push every row down it, only accept a new
+  // client once the previous one has gone away
+  while(!streamClient || !streamClient.connected())
   {
-    client = server.available();
+    streamClient.stop();
+    streamClient = server.available();
   }
-  client.println(formatedData);
-  client.stop();
+  streamClient.setNoDelay(true);
+}
+
+void sendData(String formatedData)
+{
+  digitalWrite(clientLedPin, HIGH);
+  waitForClient();
+  streamClient.println(formatedData);
+  digitalWrite(clientLedPin, LOW);
+}
+
+void sendFrame(int calculated, unsigned long timeInSeconds, const float *fields)
+{
+  telemetry_frame frame;
+  telemetryFrameBuild(&frame,telemetrySequence++,calculated,timeInSeconds,fields);
+  digitalWrite(clientLedPin, HIGH);
+  waitForClient();
+  streamClient.write((const uint8_t *)&frame,sizeof(frame));
   digitalWrite(clientLedPin, LOW);
 }
\ No newline at end of file
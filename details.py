@@ -5,4 +5,50 @@ GITHUB_ACCESS_TOKEN = " "
 API_KEY = " "
 LOCATION = "Maynooth, Ireland"
 BASE_PATH = r" "
-COM_PORT = "COM8"
\ No newline at end of file
+COM_PORT = "COM8"
+LOG_FLUSH_ROWS = 50
+LOG_FLUSH_SECONDS = 10
+LOG_EXPORT_EXCEL = True
+ESP32_RESOLVERS = ["github"]
+ESP32_IP_TTL = 3600
+ESP32_IP_RETRY = 30
+ESP32_STATIC_IP = " "
+ESP32_IP_FILE = " "
+ESP32_MDNS_HOST = "esp32.local"
+ESP32_PORT = 80
+WEATHER_TTL = 300
+PIPELINE_QUEUE_SIZE = 1000
+PIPELINE_RETRY_DELAY = 1
+WIFI_STREAM = True
+STREAM_READ_TIMEOUT = 30
+STREAM_MAX_BACKOFF = 60
+TELEMETRY_BINARY = False
+TIME_SYNC_INTERVAL = 60
+TIME_SYNC_MAX_SKEW = 2
+SUPERVISOR_MAX_BACKOFF = 60
+EPHEMERIS_STEP = 600
+EPHEMERIS_HEADER_STEP = 900
+METRICS_FILE = "logger_metrics.json"
+METRICS_INTERVAL = 10
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9100
+METRICS_RATE_WINDOW = 60
+ENERGY_MAX_GAP = 120
+ENERGY_FLUSH_SECONDS = 60
+# Servo energy per tracking run for the SPA and the tracking panel each, in Wh: supply voltage
+# x current while moving x seconds spent moving / 3600. 5 V x 0.34 A x 0.4 s = 0.000189 Wh, the
+# 0.000094 * 2 that TotalPower takes off the average power (in W there). Set from the rig.
+SERVO_VOLTAGE = 5.0
+SERVO_CURRENT = 0.34
+SERVO_RUN_SECONDS = 0.4
+SERVO_ENERGY_PER_RUN = SERVO_VOLTAGE * SERVO_CURRENT * SERVO_RUN_SECONDS / 3600
+ARCHIVE_DIRECTORY = "archive"
+ARCHIVE_BATCH_ROWS = 65536
+FLEET_DEVICES = []
+FLEET_STALE_SECONDS = 60
+LIVE_HOURS = 6
+LIVE_BUFFER_ROWS = 43200
+LIVE_HOST = "127.0.0.1"
+LIVE_PORT = 9101
+VALIDATION_MAX_STEP = 300
+CACHE_MEMO_TABLES = 32
\ No newline at end of file
@@ -0,0 +1,43 @@
+#ifndef TELEMETRY_FRAME_H
+#define TELEMETRY_FRAME_H
+
+#include <stdint.h>
+
+// Fixed layout binary alternative to the comma separated record, decoded on the host by
+// TelemetryFrame.py. Little endian, packed, 86 bytes per frame.
+#define TELEMETRY_MAGIC 0x5AA5
+#define TELEMETRY_VERSION 1
+#define TELEMETRY_FIELDS 18
+
+typedef struct __attribute__((packed))
+{
+    uint16_t magic;
+    uint8_t version;
+    uint8_t calculated;
+    uint32_t sequence;
+    uint32_t timeOfDay;                 // Seconds since midnight of the logged time
+    float fields[TELEMETRY_FIELDS];     // Same order as the comma separated record
+    uint16_t checksum;                  // Sum of all preceding bytes, modulo 65536
+} telemetry_frame;
+
+static inline void telemetryFrameBuild(telemetry_frame *frame, uint32_t sequence, uint8_t calculated, uint32_t timeOfDay, const float *fields)
+{
+    frame->magic = TELEMETRY_MAGIC;
+    frame->version = TELEMETRY_VERSION;
+    frame->calculated = calculated;
+    frame->sequence = sequence;
+    frame->timeOfDay = timeOfDay;
+    for(int i = 0; i < TELEMETRY_FIELDS; i++)
+    {
+        frame->fields[i] = fields[i];
+    }
+    const uint8_t *bytes = (const uint8_t *)frame;
+    uint16_t checksum = 0;
+    for(unsigned int i = 0; i < sizeof(telemetry_frame) - sizeof(frame->checksum); i++)
+    {
+        checksum += bytes[i];
+    }
+    frame->checksum = checksum;
+}
+
+#endif